@@ -1,16 +1,14 @@
-from minecraft_api import GetMojangAPIData
-from hypixel_api import GetHypixelData
-from cape_animator import CapeAnimator
-from online_status import OnlineStatus
-from cache_manager import CacheManager
-from data_manager import DataManager
-from utils import pillow_to_b64, load_base64_to_pillow
+from startup_timer import StartupTimer
+startup_timer = StartupTimer() # started before anything heavy is imported
+
+# the data layer (requests, numpy, PIL, the SQLite cache) is imported on first use, see FakeMCApp.data_manager
 import flet as ft
 import os
 from dotenv import load_dotenv
-from PIL import Image
 import time
 import threading
+import asyncio
+import base64
 import json
 from pathlib import Path
 import logging
@@ -30,7 +28,8 @@ logging.basicConfig(
 
 # contains flet ui and calls other modules
 
-load_dotenv()
+load_dotenv() # read once here, the api modules get the key passed in
+startup_timer.mark("imports")
 
 app_logger.info(f"running in: {current_file_path}")
 
@@ -45,6 +44,13 @@ class FakeMCApp:
 
         self.current_mojang_data = None
 
+        # lookups run on their own event loop, so the ui stays responsive and a new search can cancel a slow one
+        self.lookup_loop = asyncio.new_event_loop()
+        threading.Thread(target = self.lookup_loop.run_forever, name = "lookup-loop", daemon = True).start()
+        self.lookup_lock = threading.Lock()
+        self.search_generation = 0 # bumped for every search, results are only shown while their generation is current
+        self.current_lookup = None
+
         # variables for settings
         self.completed_onboarding_flow = None
         self.settings = []
@@ -64,6 +70,14 @@ class FakeMCApp:
                 self.completed_onboarding_flow = self.settings["completed_onboarding_flow"]
                 self.cache_time = self.settings["cache_time"]
                 self.cache_enabled = self.settings["cache_enabled"]
+                self.http_pool_size = self.settings.get("http_pool_size", 10)
+                self.http_timeout = self.settings.get("http_timeout", 10)
+                self.storage_profile = self.settings.get("storage_profile", {})
+                self.cache_ttl_policy = self.settings.get("cache_ttl_policy", {})
+                self.rate_limits = self.settings.get("rate_limits", {})
+                self.prefetch_enabled = self.settings.get("prefetch_enabled", True)
+                self.prefetch_hypixel = self.settings.get("prefetch_hypixel", False)
+                self.gradient_color = self.settings.get("gradient_color", "average")
             except Exception as e:
                 app_logger.error(f"Something went wrong, resetting to defaults: {e}")
                 self.settings = {}
@@ -73,6 +87,14 @@ class FakeMCApp:
                 self.completed_onboarding_flow = True
                 self.cache_time = 300
                 self.cache_enabled = True
+                self.http_pool_size = 10
+                self.http_timeout = 10
+                self.storage_profile = {}
+                self.cache_ttl_policy = {}
+                self.rate_limits = {}
+                self.prefetch_enabled = True
+                self.prefetch_hypixel = False
+                self.gradient_color = "average"
                 self.save_settings()
         else:
             app_logger.info("No config file detected")
@@ -81,7 +103,20 @@ class FakeMCApp:
             self.guild_members_to_fetch = 15
             self.cache_time = 300
             self.cache_enabled = True
-        
+            self.http_pool_size = 10
+            self.http_timeout = 10
+            self.storage_profile = {}
+            self.cache_ttl_policy = {}
+            self.rate_limits = {}
+            self.prefetch_enabled = True
+            self.prefetch_hypixel = False
+            self.gradient_color = "average" # "average" or "dominant" cape colour
+
+        # the data manager (http transport, cache connection) and the prefetcher are created on first use, see data_manager
+        self._data_manager = None
+        self._prefetcher = None
+        self._favorites = None
+        self.subsystem_lock = threading.Lock()
 
         if self.page.platform_brightness == ft.Brightness.LIGHT: # disables gradient if theme is light
             self.enable_gradient = False
@@ -100,6 +135,55 @@ class FakeMCApp:
         else:
             self.load_setup_tab_1()
 
+    @property
+    def data_manager(self):
+        """one data manager (and cache connection) for the whole app, settings changes are applied to it directly"""
+        self._init_subsystems()
+        return self._data_manager
+
+    @property
+    def prefetcher(self):
+        """warms the cache for favorites and guildmates in the background (None if disabled), see prefetch_players"""
+        self._init_subsystems()
+        return self._prefetcher
+
+    @property
+    def favorites(self):
+        """the FavoritesStore, favorites live in cache.db next to the cache"""
+        self._init_subsystems()
+        return self._favorites
+
+    def _init_subsystems(self) -> None:
+        """imports and sets up the data layer, deferred so it doesn't delay the first paint"""
+        with self.subsystem_lock:
+            if self._data_manager is not None:
+                return
+            from http_client import configure_transport
+            from cache_manager import get_cache_manager
+            from data_manager import DataManager
+            from prefetcher import Prefetcher
+            from favorites import FavoritesStore
+
+            configure_transport(pool_size = self.http_pool_size, timeout = self.http_timeout, rate_limits = self.rate_limits)
+            data_manager = DataManager(
+                self.hypixel_api_key, self.cache_enabled, self.cache_time, cache_instance = get_cache_manager(self.storage_profile, self.cache_ttl_policy)
+                )
+            self._prefetcher = Prefetcher(data_manager) if self.prefetch_enabled else None
+            self._favorites = FavoritesStore(data_manager.cache_instance)
+            self._favorites.migrate_from_json(self.favorites_location) # favorites.json from older versions
+            self._data_manager = data_manager
+
+    def warm_up(self) -> None:
+        """runs after the first paint: loads the data layer so the first search doesn't wait for it, then warms caches"""
+        self._init_subsystems()
+        startup_timer.mark("data layer")
+        self.load_favorites_page()
+        startup_timer.mark("favorites")
+        self.index_cape_colors()
+        startup_timer.mark("cape colours")
+        self.prefetch_players()
+        startup_timer.report()
+
     def get_data_from_button(self, e) -> None:
         data_entered = self.username_entry.value.strip()
         self.update_contents(data_entered)
@@ -198,7 +282,7 @@ class FakeMCApp:
             on_change = self.update_guild_members_to_fetch,
             width = 50
         )
-        self.guild_members_to_fetch_info = ft.Icon(name = ft.Icons.INFO_OUTLINE_ROUNDED, tooltip = "Very high values can cause rate limits")
+        self.guild_members_to_fetch_info = ft.Icon(name = ft.Icons.INFO_OUTLINE_ROUNDED, tooltip = "Members are loaded page by page, very high values take longer to finish loading")
 
         self.guild_members_to_fetch_row = ft.Row(controls = [self.guild_members_to_fetch_text, self.guild_members_to_fetch_input, self.guild_members_to_fetch_info])
 
@@ -367,6 +451,7 @@ class FakeMCApp:
             self.hypixel_integration_enabled = False
             self.save_settings()
             self.hypixel_api_key = ""
+            self.data_manager.hypixel_api_key = self.hypixel_api_key
             app_logger.info(f"new api key: {self.hypixel_api_key}")
             try:
                 with open(current_directory / ".env", "w") as file:
@@ -395,15 +480,19 @@ class FakeMCApp:
 
         # --- tab 2 (favorites) ---
         self.favorites_listview = ft.ListView(spacing = 20)
+        self.favorite_cards = {} # uuid -> card in favorites_listview, so a toggle only adds or removes that card
 
         self.favorites_tab = ft.Container(content = self.favorites_listview, margin = 20, padding = 20)
 
         # --- tab 3 (cape gallery) ---
+        # filled the first time the tab is opened (see tab_changed), only visible items are built
         self.cape_gallery = ft.GridView(
             spacing = 5,
             expand = True,
             max_extent=150,
+            build_controls_on_demand = True
         )
+        self.cape_gallery_loaded = False
 
         # --- tab 4 (config)
         self.config_col = self.load_ui_tab_4()
@@ -437,6 +526,7 @@ class FakeMCApp:
         self.tabs = ft.Tabs(
             selected_index = 0,
             animation_duration = 300,
+            on_change = self.tab_changed,
             tabs = [
                 ft.Tab(
                     text = "Home",
@@ -466,20 +556,54 @@ class FakeMCApp:
         
         self.page.add(self.tabs)
 
-    def create_cape_showcase(self, file) -> None:
+    def tab_changed(self, e) -> None:
+        if self.tabs.selected_index == 2 and not self.cape_gallery_loaded:
+            self.load_cape_gallery()
+
+    def load_cape_gallery(self) -> None:
+        """fills the cape gallery from the gallery manifest (regenerated when cape/ changes)"""
+        self.cape_gallery_loaded = True
+        from cape_gallery import load_gallery_manifest
+        capes = load_gallery_manifest(current_directory / "cape", current_directory / "storage" / "cape_gallery.json")
+        for cape in capes:
+            self.create_cape_showcase(cape)
+        self.cape_gallery.update()
+
+    def create_cape_showcase(self, cape) -> None:
         cape_item = ft.Image(
-                src = current_directory / "cape" / file,
+                src_base64 = cape["image_b64"],
                 fit = ft.ImageFit.FIT_HEIGHT,
                 filter_quality = ft.FilterQuality.NONE,
                 height = 80,
             )
         
-        cape_name = ft.Text(value = file[:-4], text_align = ft.alignment.center)
+        cape_name = ft.Text(value = cape["name"], text_align = ft.alignment.center)
         
         self.cape_gallery.controls.append(
             ft.Column(controls = [cape_item, cape_name], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
         )
 
+    def index_cape_colors(self) -> None:
+        """computes the colours of every cape in cape/ that isn't in the cache yet, all in one pass"""
+        if not self.data_manager.cache_enabled:
+            return
+        from minecraft_api import CAPE_MAP
+        from palette import analyze_folder
+        from cape_gallery import is_gallery_file
+        cape_folder = current_directory / "cape"
+        cape_hashes = {cape_id: cape_hash for cape_hash, cape_id in CAPE_MAP.items()} # files are named after the cape
+        file_names = [
+            file for file in os.listdir(cape_folder)
+            if is_gallery_file(file)
+            and self.data_manager.cache_instance.get_texture_colors(cape_hashes.get(file[:-4], file[:-4]), "cape_front") is None
+            ]
+        if not file_names:
+            return
+        cape_colors = analyze_folder(cape_folder, file_names)
+        self.data_manager.cache_instance.add_texture_colors(
+            {cape_hashes.get(cape_id, cape_id): colors for cape_id, colors in cape_colors.items()}, "cape_front"
+            )
+
     def cape_hover(self, e) -> None:
         if e.data == "true":
             if self.has_cape:
@@ -492,21 +616,84 @@ class FakeMCApp:
 
     def update_contents(self, data_entered) -> None:
         """
-        handles updating the ui, including managing animations
-        req data_entered (minecraft username or uuid)
+        starts a lookup for data_entered (minecraft username or uuid) on the lookup loop and returns right away,
+        a newer lookup cancels the one before it
         """
 
         self.tabs.selected_index = 0
 
         app_logger.info(f"data entered: {data_entered}")
+        if self._prefetcher is not None: # foreground lookups get the rate limit budget
+            self._prefetcher.cancel()
 
         self.skin_showcase_img.scale = 0.3
         self.page.update()
 
-        mojang_data_instance = DataManager(self.hypixel_api_key, self.cache_enabled, self.cache_time)
-        mojang_data = mojang_data_instance.get_mojang_data(data_entered)
+        with self.lookup_lock:
+            self.search_generation += 1
+            generation = self.search_generation
+            if self.current_lookup is not None:
+                self.current_lookup.cancel()
+            self.current_lookup = asyncio.run_coroutine_threadsafe(self.lookup(data_entered, generation), self.lookup_loop)
+            self.current_lookup.add_done_callback(self.lookup_done)
+
+    def is_current_search(self, generation: int) -> bool:
+        """False once a newer search has started, results from older searches aren't shown"""
+        return generation == self.search_generation
+
+    def lookup_done(self, future) -> None:
+        if not future.cancelled() and future.exception() is not None:
+            app_logger.error(f"lookup failed: {future.exception()}")
+
+    async def lookup(self, data_entered: str, generation: int) -> None:
+        """
+        fetches and shows a player progressively: the profile as soon as Mojang answers,
+        then Hypixel data and online status, each as soon as it arrives
+        """
+        hypixel_lookup_enabled = self.hypixel_api_key is not None and self.hypixel_api_key != "" and self.hypixel_integration_enabled
+        if hypixel_lookup_enabled:
+            self.show_hypixel_loading()
+
+        mojang_data = await self.data_manager.get_mojang_data_async(data_entered)
+        if not self.is_current_search(generation):
+            return
         app_logger.info(mojang_data)
+        self.show_mojang_data(mojang_data, generation)
+        if mojang_data["status"] != "success":
+            return
 
+        if hypixel_lookup_enabled:
+            app_logger.info(f"accessing hypixel api with api key: ****{self.hypixel_api_key[-4:]}")
+        elif self.hypixel_integration_enabled and not self.hypixel_api_key:
+            if not self.user_dismissed_no_api_banner: # only shows banner if it hasn't already been dismissed by the user
+                self.page.open(self.no_api_key_banner)
+            self.guild_list_view.controls.clear()
+            self.hypixel_info_card.visible = False
+            self.guild_name_text.value = ""
+        else:
+            app_logger.info("hypixel integration is currently disabled")
+
+        async def hypixel():
+            if not hypixel_lookup_enabled:
+                return None
+            hypixel_data = await self.data_manager.get_hypixel_data_async(
+                mojang_data["uuid"], self.guild_members_to_fetch, resolve_guild_members = False
+                )
+            if self.is_current_search(generation):
+                await self.load_hypixel_data(mojang_data, hypixel_data, generation)
+            return hypixel_data
+
+        async def online_status():
+            status = await self.data_manager.get_online_status_async(mojang_data["username"], mojang_data["uuid"])
+            if self.is_current_search(generation):
+                self.show_online_status(mojang_data, status)
+
+        hypixel_data, _ = await asyncio.gather(hypixel(), online_status())
+
+        if self.is_current_search(generation):
+            self.prefetch_players([member["uuid"] for member in hypixel_data["guild_roster"]] if hypixel_data is not None else [])
+
+    def show_mojang_data(self, mojang_data: dict, generation: int) -> None:
         if mojang_data["status"] == "success":
             app_logger.info(f"success for getting mojang data: {mojang_data['status']}")
             self.formated_username_text.value = mojang_data['username']
@@ -519,12 +706,12 @@ class FakeMCApp:
                 self.has_cape = True
                 app_logger.info(f"{mojang_data['username']} has cape: {mojang_data['cape_name']}")
                 self.cape_name.value = mojang_data['cape_name']
-                self.animate_cape(mojang_data)
+                self.animate_cape(mojang_data, generation)
                 self.update_gradient(mojang_data)
             else:
                 self.has_cape = False
                 app_logger.info(f"{mojang_data['username']} has no cape")
-                self.cape_showcase_img.src_base64 = pillow_to_b64(Image.open(current_directory / "cape" / "no_cape.png"))
+                self.cape_showcase_img.src_base64 = base64.b64encode((current_directory / "cape" / "no_cape.png").read_bytes()).decode("utf-8")
                 self.cape_name.value = ""
                 self.home_page_container.gradient = ft.RadialGradient(colors = [ft.Colors.TRANSPARENT, ft.Colors.TRANSPARENT])
                 self.page.update()
@@ -538,6 +725,11 @@ class FakeMCApp:
                 self.data_status_icon.name = "CACHED"
                 self.data_status_icon.tooltip = "Data loaded from cache"
                 self.data_status_icon.color = ft.Colors.YELLOW_700
+            elif mojang_data["source"] == "cache_stale":
+                self.data_status_icon.visible = True
+                self.data_status_icon.name = "UPDATE"
+                self.data_status_icon.tooltip = "Data loaded from an expired cache, refreshing in the background"
+                self.data_status_icon.color = ft.Colors.ORANGE_700
             elif mojang_data["source"] == "mojang_api":
                 self.data_status_icon.visible = True
                 self.data_status_icon.name = "CLOUD_DOWNLOAD"
@@ -550,14 +742,11 @@ class FakeMCApp:
             self.reset_controls()
 
         # checks if user is in favorites
-        favorites = self.load_favorites()
         if mojang_data["status"] == "success":
             self.favorite_chip.visible = True
-            for favorite in favorites:
-                if favorite["uuid"] == mojang_data["uuid"]:
-                    self.favorite_chip.icon = ft.Icons.FAVORITE_SHARP
-                    self.favorite_chip.tooltip = "Unfavorite"
-                    break
+            if mojang_data["uuid"] in self.favorites:
+                self.favorite_chip.icon = ft.Icons.FAVORITE_SHARP
+                self.favorite_chip.tooltip = "Unfavorite"
             else:
                 self.favorite_chip.icon = ft.Icons.FAVORITE_OUTLINE
                 self.favorite_chip.tooltip = "Favorite"
@@ -565,22 +754,7 @@ class FakeMCApp:
             self.favorite_chip.visible = False
         self.page.update()
 
-        if self.hypixel_api_key is not None and self.hypixel_api_key != "":
-            if self.hypixel_integration_enabled:
-                app_logger.info(f"accessing hypixel api with api key: ****{self.hypixel_api_key[-4:]}")
-                self.load_hypixel_data(mojang_data) 
-            else:
-                app_logger.info("hypixel integration is currently disabled")
-        else:
-            if self.hypixel_integration_enabled:
-                if not self.user_dismissed_no_api_banner: # only shows banner if it hasn't already been dismissed by the user
-                    self.page.open(self.no_api_key_banner)
-                self.guild_list_view.controls.clear()
-                self.hypixel_info_card.visible = False
-                self.guild_name_text.value = ""
-
-        
-        status = self.get_online_status(mojang_data)
+    def show_online_status(self, mojang_data: dict, status: str) -> None:
         app_logger.info(f"{mojang_data["username"]}'s status: {status}")
         if status == "Hypixel":
             self.player_status_text.value = "Online (Hypixel)"
@@ -591,17 +765,18 @@ class FakeMCApp:
         elif status == "offline":
             self.player_status_text.value = "Offline"
             self.player_status_icon.color = ft.Colors.GREY_700
-        else:
+        elif status is not None:
             self.player_status_text.value = "Unknown"
         self.page.update()
         
-    def animate_cape(self, mojang_data) -> None:
+    def animate_cape(self, mojang_data, generation: int) -> None:
         animation_thread = threading.Thread(
             target = self.cape_animation_in_thread,
                 args = (
-                    self.page,
                     self.cape_showcase_img,
+                    mojang_data["cape_name"],
                     mojang_data["cape_showcase_b64"],
+                    generation
             ),
         )
         animation_thread.daemon = True
@@ -621,9 +796,8 @@ class FakeMCApp:
         self.home_page_container.gradient = ft.RadialGradient(colors = [ft.Colors.TRANSPARENT, ft.Colors.TRANSPARENT])
 
     def update_gradient(self, mojang_data: dict) -> None:
-        cape_pillow = load_base64_to_pillow(mojang_data["cape_showcase_b64"])
-        bgcolor_instance = CapeAnimator(cape_pillow)
-        bgcolor = bgcolor_instance.get_average_color_pil()
+        cape_colors = self.data_manager.get_cape_colors(mojang_data["cape_hash"], mojang_data["cape_showcase_b64"])
+        bgcolor = cape_colors.get(self.gradient_color) or cape_colors["average"]
         if bgcolor is not None and self.enable_gradient:
             self.home_page_container.gradient = ft.RadialGradient(colors = [bgcolor, ft.Colors.TRANSPARENT], center = ft.Alignment(-0.35, 0), radius = 0.7) # handle gradient color
         else:
@@ -631,18 +805,19 @@ class FakeMCApp:
             app_logger.warning("Cape color not found")
         self.page.update()
 
-    def load_hypixel_data(self, mojang_data: dict) -> None:
+    def show_hypixel_loading(self) -> None:
+        """shows a progress ring in the hypixel card while data is being fetched"""
+        self.hypixel_info_card.content.content = ft.ProgressRing()
+        self.first_login_text.value = ""
+        self.player_rank_text.value = ""
+        self.hypixel_info_card.visible = True
+        self.guild_name_text.value = ""
+        self.guild_list_view.controls.clear()
+        self.page.update()
+
+    async def load_hypixel_data(self, mojang_data: dict, hypixel_data: dict, generation: int) -> None:
         # --- Hypixel api integration ---
-        if mojang_data["uuid"] is not None:
-            self.hypixel_info_card.content.content = ft.ProgressRing()
-            self.first_login_text.value = ""
-            self.player_rank_text.value = ""
-            self.hypixel_info_card.visible = True
-            self.guild_name_text.value = ""
-            self.guild_list_view.controls.clear()
-            self.page.update()
-            hypxiel_data_instance = DataManager(self.hypixel_api_key, self.cache_enabled, self.cache_time)
-            hypixel_data = hypxiel_data_instance.get_hypixel_data(mojang_data["uuid"], self.guild_members_to_fetch)
+        if mojang_data["uuid"] is not None and hypixel_data is not None:
             if hypixel_data["status"] == "success":
                 if hypixel_data["first_login"] is not None and hypixel_data["player_rank"] is not None:
                     app_logger.info("displaying hypixel info card")
@@ -662,10 +837,20 @@ class FakeMCApp:
                     self.player_rank_text.value = ""
                     self.guild_name_text.value = ""
                     self.page.update()
+            elif hypixel_data["status"] == "player_not_found":
+                app_logger.info(f"{mojang_data["username"]} has no hypixel profile")
+                self.hypixel_info_card.visible = False
+                self.first_login_text.value = ""
+                self.player_rank_text.value = ""
+                self.guild_name_text.value = ""
+                self.page.update()
             # error handling
             elif hypixel_data["status"] == "invalid_api_key":
                 self.hypixel_request_error_banner.content.value = f"Your Hypixel API key is invalid. Please update it in Settings or disable Hypixel integration."
                 self.page.open(self.hypixel_request_error_banner)
+            elif hypixel_data["status"] == "rate_limited":
+                self.hypixel_request_error_banner.content.value = f"Hypixel is rate limiting your API key, try again in a few minutes or lower Max guild members in Settings."
+                self.page.open(self.hypixel_request_error_banner)
             elif hypixel_data["status"] == "http_error":
                 self.hypixel_request_error_banner.content.value = f"An unexpected HTTP error occurred: {hypixel_data["status"]}"
             elif hypixel_data["status"] == "request_error":
@@ -685,28 +870,37 @@ class FakeMCApp:
             self.page.update()
             return
 
-        if hypixel_data["guild_members"] is None:
-            self.guild_list_view.controls.clear()
-            self.page.update()
+        self.guild_list_view.controls.clear()
+        if not hypixel_data["guild_roster"]:
             self.guild_name_text.value = ""
+            self.page.update()
+            return
 
-        if hypixel_data["guild_members"] is not None:
-            self.guild_list_view.controls.clear()
-            for member in hypixel_data["guild_members"]:
-                guild_member_name = member["name"]
-                if guild_member_name is not None:
-                    self.guild_list_view.controls.append(
-                        ft.Button(
-                            text = guild_member_name,
-                            on_click = lambda e, name_to_pass = member["uuid"]: self.update_contents(name_to_pass)
-                        )
+        self.guild_name_text.value = hypixel_data["guild_name"]
+        self.page.update()
+        if hypixel_data["guild_members"] is not None: # names were already resolved
+            self.add_guild_member_buttons(hypixel_data["guild_members"])
+        else:
+            # names are resolved page by page, the first page shows up right away and the rest is appended
+            await self.stream_guild_members([member["uuid"] for member in hypixel_data["guild_roster"]], generation)
+
+    async def stream_guild_members(self, member_uuids: list[str], generation: int) -> None:
+        async for page in self.data_manager.iter_guild_member_pages(member_uuids):
+            if not self.is_current_search(generation):
+                return
+            self.add_guild_member_buttons(page)
+
+    def add_guild_member_buttons(self, members: list[dict]) -> None:
+        for member in members:
+            guild_member_name = member["name"]
+            if guild_member_name is not None:
+                self.guild_list_view.controls.append(
+                    ft.Button(
+                        text = guild_member_name,
+                        on_click = lambda e, name_to_pass = member["uuid"]: self.update_contents(name_to_pass)
                     )
-                self.guild_name_text.value = hypixel_data["guild_name"]
-                self.page.update()
-
-    def get_online_status(self, mojang_data) -> str:
-        active_user_status = OnlineStatus(mojang_data["username"], mojang_data["uuid"], self.hypixel_api_key) # TODO UPDATE THIS TO USE NEW DATA FROMAT
-        return active_user_status.start_requests()
+                )
+        self.page.update()
 
     def get_cache_size(self) -> str:
         """Returns cache size in KB as a formatted string"""
@@ -724,101 +918,99 @@ class FakeMCApp:
 
     # favorites
     def favorites_clicked(self, e) -> None:
-        # get data from favorites.json
-        favorites = self.load_favorites()
-
-        new_favorite = {
-            "uuid": self.current_mojang_data["uuid"],
-            "username": self.current_mojang_data["username"],
-            "skin_b64": self.current_mojang_data["skin_showcase_b64"],
-            }
-
-        if new_favorite not in favorites:
-            favorites.append(new_favorite)
-            app_logger.info(f"you added {self.current_mojang_data["username"]} to favorites!\nuuid: {self.current_mojang_data["uuid"]}")
+        uuid = self.current_mojang_data["uuid"]
+        if uuid not in self.favorites:
+            self.favorites.add(
+                uuid, self.current_mojang_data["username"], self.current_mojang_data["skin_showcase_b64"], self.current_mojang_data["skin_hash"]
+                )
+            app_logger.info(f"you added {self.current_mojang_data["username"]} to favorites!\nuuid: {uuid}")
             self.favorite_chip.icon = ft.Icons.FAVORITE_SHARP
             self.favorite_chip.tooltip = "Unfavorite"
             self.favorite_chip.update()
+            self.add_favorite_card({
+                "uuid": uuid, "username": self.current_mojang_data["username"], "skin_b64": self.current_mojang_data["skin_showcase_b64"]
+                })
         else:
-            favorites.remove(new_favorite)
+            self.favorites.remove(uuid)
             app_logger.info(f"you removed {self.current_mojang_data["username"]} from favorites")
             self.favorite_chip.icon = ft.Icons.FAVORITE_OUTLINE
             self.favorite_chip.tooltip = "Favorite"
             self.favorite_chip.update()
-        
-        # write new favorites.json
-        self.save_favorites(favorites)
-        self.load_favorites_page()
+            self.remove_favorite_card(uuid)
+
+        self.tabs.update()
 
-    def load_favorites(self) -> list:
-        try:
-            with open(self.favorites_location, "r", encoding = "utf-8") as file:
-                return json.load(file)
-            
-        except Exception as e:
-            app_logger.error(f"Something went while reading favorites.json: {e}")
-            return []
-        
     def delete_favorite(self, uuid_to_delete) -> None:
         """Deletes a favorite, by uuid"""
-        favorites = self.load_favorites()
-        for favorite in favorites:
-            if favorite["uuid"] == uuid_to_delete:
-                app_logger.warning(f"favorite {favorite["username"]} has been removed")
-                favorites.remove(favorite)
-                break
-        self.save_favorites(favorites)
-        self.load_favorites_page() # reload favorites
+        self.favorites.remove(uuid_to_delete)
+        app_logger.warning(f"favorite {uuid_to_delete} has been removed")
+        self.remove_favorite_card(uuid_to_delete)
         self.page.update()
 
-    def save_favorites(self, favorites: dict) -> None:
-        try:
-            with open(self.favorites_location, "w", encoding = "utf-8") as file:
-                json.dump(favorites, file, indent = 4)   
-        except Exception as e:
-            app_logger.error(f"Something went wrong while saving favorites: {e}")
-
     def load_favorites_page(self) -> None:
+        """builds the favorites tab from scratch, toggles after that only add or remove one card"""
         self.favorites_listview.controls.clear()
-        favorites = self.load_favorites()
+        self.favorite_cards.clear()
+        favorites = self.favorites.all()
         try:
             for favorite in favorites:
-                self.favorites_listview.controls.append(
-                    ft.Card(
-                        content = ft.Container(
-                            ft.Row(controls = [
-                                ft.Column(
-                                controls = [
-                                    ft.Image(src_base64 = favorite["skin_b64"], filter_quality = ft.FilterQuality.NONE, height = 100, fit = ft.ImageFit.FILL),
-                                ]
-                                ),
-                                ft.Column(
-                                    controls = [
-                                        ft.Text(value = favorite["username"], size = 16),
-                                        ft.Text(value = favorite["uuid"], size = 12, color = ft.Colors.GREY_700),
-                                        ft.Row(controls = [
-                                            ft.Button(text = "See more", on_click = lambda e, uuid = favorite["uuid"]: self.update_contents(uuid)),
-                                            ft.Button(text = "Remove", on_click = lambda e, uuid = favorite["uuid"]: self.delete_favorite(uuid))
-                                            ]
-                                        )
-                                    ]
-                                )
-                            ]
-                            ),
-                            
-                            padding = ft.padding.all(20),
-                        )
-                    )
-                )
+                self.add_favorite_card(favorite)
         except Exception as e:
             app_logger.error(f"Something went wrong while loading favorites: {e}")
         self.tabs.update()
 
-    def cape_animation_in_thread(self, page_obj, cape_img_control, cape_b64) -> None:
-        animator = CapeAnimator(load_base64_to_pillow(cape_b64))
-        while animator.get_revealed_pixels() < 160:
-            cape_img_control.src_base64 = animator.animate()
-            page_obj.update()
+    def add_favorite_card(self, favorite: dict) -> None:
+        """appends a card for favorite ({"uuid", "username", "skin_b64"}) to the favorites tab"""
+        if favorite["uuid"] in self.favorite_cards:
+            return
+        card = ft.Card(
+            content = ft.Container(
+                ft.Row(controls = [
+                    ft.Column(
+                    controls = [
+                        ft.Image(src_base64 = favorite["skin_b64"], filter_quality = ft.FilterQuality.NONE, height = 100, fit = ft.ImageFit.FILL),
+                    ]
+                    ),
+                    ft.Column(
+                        controls = [
+                            ft.Text(value = favorite["username"], size = 16),
+                            ft.Text(value = favorite["uuid"], size = 12, color = ft.Colors.GREY_700),
+                            ft.Row(controls = [
+                                ft.Button(text = "See more", on_click = lambda e, uuid = favorite["uuid"]: self.update_contents(uuid)),
+                                ft.Button(text = "Remove", on_click = lambda e, uuid = favorite["uuid"]: self.delete_favorite(uuid))
+                                ]
+                            )
+                        ]
+                    )
+                ]
+                ),
+                
+                padding = ft.padding.all(20),
+            )
+        )
+        self.favorite_cards[favorite["uuid"]] = card
+        self.favorites_listview.controls.append(card)
+
+    def remove_favorite_card(self, uuid: str) -> None:
+        card = self.favorite_cards.pop(uuid, None)
+        if card is not None:
+            self.favorites_listview.controls.remove(card)
+
+    def prefetch_players(self, first_uuids: list[str] = None) -> None:
+        """warms the cache for first_uuids (e.g. the guildmates on screen) and then favorites, in the background"""
+        if self.prefetcher is None:
+            return
+        hypixel_lookup_enabled = self.hypixel_api_key is not None and self.hypixel_api_key != "" and self.hypixel_integration_enabled
+        self.prefetcher.prefetch((first_uuids or []) + self.favorites.uuids(), include_hypixel = self.prefetch_hypixel and hypixel_lookup_enabled)
+
+    def cape_animation_in_thread(self, cape_img_control, cape_id, cape_b64, generation) -> None:
+        from cape_animator import get_cape_frames
+        # frames are rendered once per cape, only the cape image is sent to the client
+        for frame in get_cape_frames(cape_id, cape_b64):
+            if not self.is_current_search(generation): # a newer search stops the animation
+                return
+            cape_img_control.src_base64 = frame
+            cape_img_control.update()
             time.sleep(0.04)
 
     # methods for settings
@@ -826,6 +1018,7 @@ class FakeMCApp:
         if self.api_edit_mode: # this happens after the user clicks has inputted the new api key
             self.api_key_row.controls = [self.api_key_label, self.api_key_display, self.api_key_button] # update the controls to include the entry
             self.hypixel_api_key = self.api_key_entry.value
+            self.data_manager.hypixel_api_key = self.hypixel_api_key
             self.api_key_display.value = self.hypixel_api_key
 
             self.api_key_button.text = "Change API Key"
@@ -900,6 +1093,7 @@ class FakeMCApp:
             self.cache_time = int(self.cache_time_input.value)
         else:
             self.cache_time = 0
+        self.data_manager.cache_time = self.cache_time
 
         self.settings["cache_time"] = self.cache_time
         self.save_settings()
@@ -908,16 +1102,17 @@ class FakeMCApp:
     def cache_switch_changed(self, e) -> None:
         if self.enable_cache_switch.value:
             self.cache_enabled = True
+            self.data_manager.cache_enabled = True
             app_logger.info(f"updated caching to: {self.cache_enabled}")
             self.save_settings()
         else:
             self.cache_enabled = False
+            self.data_manager.cache_enabled = False
             app_logger.info(f"updated caching to: {self.cache_enabled}")
             self.save_settings()
 
     def clear_cache(self, e) -> None:
-        cache_instance = CacheManager()
-        cache_instance.clear_cache()
+        self.data_manager.cache_instance.clear_cache()
         self.cache_size_text.value = self.get_cache_size()
         self.page.update()
 
@@ -929,7 +1124,15 @@ class FakeMCApp:
             "hypixel_integration": self.hypixel_integration_enabled,
             "completed_onboarding_flow": self.completed_onboarding_flow,
             "cache_enabled": self.cache_enabled,
-            "cache_time": self.cache_time
+            "cache_time": self.cache_time,
+            "http_pool_size": self.http_pool_size,
+            "http_timeout": self.http_timeout,
+            "storage_profile": self.storage_profile,
+            "cache_ttl_policy": self.cache_ttl_policy,
+            "rate_limits": self.rate_limits,
+            "prefetch_enabled": self.prefetch_enabled,
+            "prefetch_hypixel": self.prefetch_hypixel,
+            "gradient_color": self.gradient_color
             }
         with open(self.settings_location, "w") as file:
             json.dump(settings, file, indent = 4)
@@ -971,11 +1174,13 @@ class FakeMCApp:
     
     def check_hypixel_key(self, e):
         api_key_entered = self.setup_hypixel_api_entry.value
+        from hypixel_api import GetHypixelData
         test_api_instance = GetHypixelData("f7c77d999f154a66a87dc4a51ef30d19", api_key_entered) # tries to get info about player Hypixel as test
         _, _, result = test_api_instance.get_basic_data()
         if result == "success":
             app_logger.info("Test Api request was successful")
             self.hypixel_api_key = api_key_entered
+            self.data_manager.hypixel_api_key = self.hypixel_api_key
             self.hypixel_integration_enabled = True
             self.save_settings()
             app_logger.info("Hypixel integration is enabled")
@@ -1003,21 +1208,17 @@ class FakeMCApp:
         app_logger.info("Completed setup flow")
         self.page.controls.clear()
         self.load_main_ui()
-        for file in os.listdir(current_directory / "cape"):
-            if "raw" not in file and "no_cape" not in file and "back" not in file:
-                self.create_cape_showcase(file)
-        self.load_favorites_page()
         self.page.update()
+        threading.Thread(target = self.warm_up, daemon = True).start()
 
 def main_entry_point(page: ft.Page):
+    startup_timer.mark("flet")
     app_instance = FakeMCApp(page)
+    startup_timer.mark("ui")
 
     if app_instance.completed_onboarding_flow:
-        for file in os.listdir(current_directory / "cape"):
-            if "raw" not in file and "no_cape" not in file and "back" not in file:
-                app_instance.create_cape_showcase(file)
         page.update()
-
-        app_instance.load_favorites_page()
+        startup_timer.mark("first paint")
+        threading.Thread(target = app_instance.warm_up, daemon = True).start()
 
 ft.app(target = main_entry_point)
\ No newline at end of file
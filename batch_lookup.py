@@ -0,0 +1,221 @@
+from data_manager import DataManager
+from minecraft_api import get_uuids_bulk, BULK_LOOKUP_SIZE
+from cache_manager import NEGATIVE_MOJANG
+from dotenv import load_dotenv
+from collections import Counter
+import argparse
+import asyncio
+import json
+import csv
+import sys
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# headless batch mode: resolves a file (or stdin) of usernames / uuids through DataManager
+# and streams one record per line as JSON Lines or CSV
+# python batch_lookup.py players.txt --hypixel --format csv --output players.csv
+
+RECORD_FIELDS = [
+    "input", "status", "source", "uuid", "username", "has_cape", "cape_name",
+    "hypixel_status", "first_login", "player_rank", "guild_name", "guild_id", "online_status", "error"
+]
+
+
+def read_search_terms(stream):
+    """yields one search term per line, blank lines and lines starting with # are skipped"""
+    for line in stream:
+        search_term = line.strip()
+        if search_term and not search_term.startswith("#"):
+            yield search_term
+
+def bundle_to_record(search_term: str, player_bundle: dict) -> dict:
+    """flattens a player bundle into one output record, images are left out"""
+    mojang_data = player_bundle["mojang"]
+    record = {
+        "input": search_term,
+        "status": mojang_data["status"],
+        "source": mojang_data["source"],
+        "uuid": mojang_data["uuid"],
+        "username": mojang_data["username"],
+        "has_cape": mojang_data["has_cape"],
+        "cape_name": mojang_data.get("cape_name")
+    }
+
+    hypixel_data = player_bundle["hypixel"]
+    if hypixel_data is not None:
+        record["hypixel_status"] = hypixel_data["status"]
+        record["first_login"] = hypixel_data["first_login"]
+        record["player_rank"] = hypixel_data["player_rank"]
+        record["guild_name"] = hypixel_data["guild_name"]
+        record["guild_id"] = hypixel_data["guild_id"]
+
+    if player_bundle["online_status"] is not None:
+        record["online_status"] = player_bundle["online_status"]
+    return record
+
+
+class JsonLinesWriter:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, record: dict) -> None:
+        self.stream.write(json.dumps(record) + "\n")
+        self.stream.flush()
+
+
+class CsvWriter:
+    def __init__(self, stream):
+        self.stream = stream
+        self.writer = csv.DictWriter(stream, fieldnames = RECORD_FIELDS, extrasaction = "ignore")
+        self.writer.writeheader()
+
+    def write(self, record: dict) -> None:
+        self.writer.writerow(record)
+        self.stream.flush()
+
+
+class BatchLookup:
+    """
+    Resolves search terms with at most concurrency lookups in flight.
+    Usernames that aren't cached are turned into uuids with Mojang's bulk endpoint first (10 names per request),
+    everything else goes through DataManager, so the cache, rate limits and request coalescing apply.
+    Records are written as soon as they're done, so the output order doesn't follow the input.
+    """
+    def __init__(
+            self, data_manager: DataManager, concurrency: int = 8, include_hypixel: bool = False,
+            include_status: bool = False, use_bulk_lookup: bool = True
+            ):
+        self.data_manager = data_manager
+        self.concurrency = concurrency
+        self.include_hypixel = include_hypixel
+        self.include_status = include_status
+        self.use_bulk_lookup = use_bulk_lookup
+        self.status_counts = Counter()
+
+    async def run(self, search_terms, writer) -> Counter:
+        """resolves every search term and writes a record for each, returns how many records had each status"""
+        queue = asyncio.Queue(maxsize = self.concurrency * 4) # (search term, uuid if it's already known)
+
+        async def produce():
+            chunks = self._chunks(search_terms, BULK_LOOKUP_SIZE)
+            # the input is read in a thread, a slow stdin would block the lookups in flight otherwise
+            while (chunk := await asyncio.to_thread(next, chunks, None)) is not None:
+                for search_term, uuid in await self._pre_resolve(chunk, writer):
+                    await queue.put((search_term, uuid))
+            for _ in range(self.concurrency):
+                await queue.put(None)
+
+        async def work():
+            while (item := await queue.get()) is not None:
+                await self._lookup(*item, writer)
+
+        await asyncio.gather(produce(), *(work() for _ in range(self.concurrency)))
+        return self.status_counts
+
+    def _chunks(self, search_terms, size: int):
+        chunk = []
+        for search_term in search_terms:
+            chunk.append(search_term)
+            if len(chunk) == size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    async def _pre_resolve(self, chunk: list[str], writer) -> list[tuple[str, str | None]]:
+        """
+        Bulk-resolves the usernames in a chunk that aren't cached, names that don't exist are written right away.
+        Returns (search term, uuid or None) for everything that still needs a lookup.
+        """
+        names_to_resolve = [
+            search_term for search_term in chunk
+            if len(search_term) <= 16 and not self.data_manager.is_mojang_cached(search_term, include_textures = False)
+            ]
+        if not self.use_bulk_lookup or not names_to_resolve:
+            return [(search_term, None) for search_term in chunk]
+
+        resolved = await asyncio.to_thread(get_uuids_bulk, names_to_resolve, self.data_manager.transport)
+        if resolved is None: # bulk request failed, fall back to one lookup per name
+            return [(search_term, None) for search_term in chunk]
+
+        pending = []
+        for search_term in chunk:
+            if search_term not in names_to_resolve:
+                pending.append((search_term, None))
+            elif search_term.lower() in resolved:
+                pending.append((search_term, resolved[search_term.lower()][0]))
+            else:
+                if self.data_manager.cache_enabled:
+                    self.data_manager.cache_instance.add_negative_cache(NEGATIVE_MOJANG, search_term)
+                self._write(writer, {"input": search_term, "status": "lookup_failed", "source": "mojang_api"})
+        return pending
+
+    async def _lookup(self, search_term: str, uuid: str | None, writer) -> None:
+        try:
+            player_bundle = await self.data_manager.get_player_bundle(
+                uuid or search_term, include_hypixel = self.include_hypixel, include_status = self.include_status,
+                resolve_guild_members = False, include_textures = False # records don't include images
+                )
+            record = bundle_to_record(search_term, player_bundle)
+        except Exception as e:
+            logger.error(f"lookup failed for {search_term}: {e}")
+            record = {"input": search_term, "status": "error", "error": str(e)}
+        self._write(writer, record)
+
+    def _write(self, writer, record: dict) -> None:
+        writer.write(record)
+        self.status_counts[record["status"]] += 1
+
+
+def main(argv = None) -> int:
+    parser = argparse.ArgumentParser(description = "Look up a list of Minecraft usernames or UUIDs without the GUI.")
+    parser.add_argument("input", nargs = "?", default = "-", help = "file with one username or UUID per line, - for stdin (default)")
+    parser.add_argument("-o", "--output", default = "-", help = "file to write results to, - for stdout (default)")
+    parser.add_argument("-f", "--format", choices = ["jsonl", "csv"], default = "jsonl", help = "output format (default: jsonl)")
+    parser.add_argument("-c", "--concurrency", type = int, default = 8, help = "lookups in flight at once (default: 8)")
+    parser.add_argument("--hypixel", action = "store_true", help = "also fetch Hypixel rank, first login and guild")
+    parser.add_argument("--status", action = "store_true", help = "also fetch online status (Hypixel is only checked with an API key)")
+    parser.add_argument("--hypixel-api-key", default = None, help = "defaults to hypixel_api_key from the environment / .env")
+    parser.add_argument("--cache-time", type = int, default = 300, help = "seconds cached data counts as fresh (default: 300)")
+    parser.add_argument("--no-cache", action = "store_true", help = "don't read or write the cache")
+    parser.add_argument("--allow-stale", action = "store_true", help = "return expired cache entries and refresh them in the background")
+    parser.add_argument("--no-bulk", action = "store_true", help = "don't use Mojang's bulk username endpoint")
+    parser.add_argument("-v", "--verbose", action = "store_true", help = "log progress to stderr")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level = logging.INFO if args.verbose else logging.WARNING, stream = sys.stderr)
+    load_dotenv()
+    hypixel_api_key = args.hypixel_api_key or os.getenv("hypixel_api_key")
+    if args.hypixel and not hypixel_api_key:
+        parser.error("--hypixel needs a Hypixel API key (--hypixel-api-key or hypixel_api_key in .env)")
+    if args.concurrency < 1:
+        parser.error("--concurrency has to be at least 1")
+
+    data_manager = DataManager(
+        hypixel_api_key, cache_enabled = not args.no_cache, cache_time = args.cache_time,
+        stale_while_revalidate = args.allow_stale
+        )
+    batch = BatchLookup(
+        data_manager, args.concurrency, include_hypixel = args.hypixel, include_status = args.status, use_bulk_lookup = not args.no_bulk
+        )
+
+    input_stream = sys.stdin if args.input == "-" else open(args.input, "r", encoding = "utf-8")
+    output_stream = sys.stdout if args.output == "-" else open(args.output, "w", encoding = "utf-8", newline = "")
+    try:
+        writer = CsvWriter(output_stream) if args.format == "csv" else JsonLinesWriter(output_stream)
+        status_counts = asyncio.run(batch.run(read_search_terms(input_stream), writer))
+    finally:
+        if input_stream is not sys.stdin:
+            input_stream.close()
+        if output_stream is not sys.stdout:
+            output_stream.close()
+
+    summary = ", ".join(f"{status}: {count}" for status, count in status_counts.most_common())
+    print(f"looked up {sum(status_counts.values())} players ({summary})", file = sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
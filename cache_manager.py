@@ -1,24 +1,224 @@
+from memory_cache import LRUTTLCache
 import sqlite3
 import logging
 from pathlib import Path
+import threading
+import functools
+import atexit
 import time
 import json
+import re
+import base64
+import hashlib
 
 logger = logging.getLogger(__file__)
 
 current_directory = Path(__file__).parent
 
+def synchronized(method):
+    """runs a CacheManager method while holding its lock, since the connection is shared between threads"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+# pragmas applied when the connection is opened, plus settings for the write-behind queue
+# can be overridden with "storage_profile" in config.json
+DEFAULT_STORAGE_PROFILE = {
+    "journal_mode": "WAL", # readers don't block the writer
+    "synchronous": "NORMAL", # no fsync on every commit, safe with WAL
+    "mmap_size": 64 * 1024 * 1024, # bytes
+    "cache_size": -8000, # negative values are in KiB
+    "busy_timeout": 5000, # ms
+    "flush_interval": 1.0, # seconds between batched commits
+    "max_pending_writes": 200, # flush early once this many writes are queued
+    "memory_cache_size": 1024, # entries per in-memory tier
+    "memory_cache_ttl": 300 # seconds an entry stays in memory
+}
+
+# seconds each cached field stays fresh, None means it never expires
+# fields that aren't listed use the time_between_cache passed to the read (the cache_time setting)
+# overridden per table and field with "cache_ttl_policy" in config.json
+DEFAULT_TTL_POLICY = {
+    "mojang_cache": {
+        "uuid": 24 * 60 * 60 # name <-> uuid mapping, names can only change every 30 days
+        # "profile" (username, skin and cape)
+    },
+    "hypixel_player_cache": {
+        "first_login": None, # never changes
+        "rank": 24 * 60 * 60,
+        "guild_id": 60 * 60 # guild membership
+    },
+    "hypixel_guild_cache": {
+        # "guild_name", "member_uuids"
+    }
+}
+
+# the timestamp column each field is checked against, fields that come from the same request share one
+# and get refreshed together once any of them is stale
+TTL_FIELDS = {
+    "mojang_cache": {"uuid": "timestamp", "profile": "timestamp"},
+    "hypixel_player_cache": {"first_login": "timestamp", "rank": "timestamp", "guild_id": "guild_timestamp"},
+    "hypixel_guild_cache": {"guild_name": "timestamp", "member_uuids": "timestamp"}
+}
+
+def content_hash(png_bytes: bytes) -> str:
+    """hash for textures that don't come with a texture url hash (32 chars, like the url hashes)"""
+    return hashlib.sha256(png_bytes).hexdigest()[:32]
+
+def _move_textures_to_blob_store(cursor: sqlite3.Cursor) -> None:
+    """migration 3: moves base64 images from mojang_cache rows into the textures table"""
+    rows = cursor.execute("SELECT uuid, skin_showcase_b64, cape_front_b64, cape_back_b64 FROM mojang_cache").fetchall()
+    for uuid, skin_showcase_b64, cape_front_b64, cape_back_b64 in rows:
+        skin_hash = None
+        if skin_showcase_b64:
+            skin_png = base64.b64decode(skin_showcase_b64)
+            skin_hash = content_hash(skin_png)
+            cursor.execute("INSERT OR IGNORE INTO textures (texture_hash, variant, png) VALUES (?, 'skin_showcase', ?)", (skin_hash, skin_png))
+
+        cape_hash = None
+        if cape_front_b64 and cape_back_b64:
+            cape_front_png = base64.b64decode(cape_front_b64)
+            cape_hash = content_hash(cape_front_png)
+            cursor.execute("INSERT OR IGNORE INTO textures (texture_hash, variant, png) VALUES (?, 'cape_front', ?)", (cape_hash, cape_front_png))
+            cursor.execute(
+                "INSERT OR IGNORE INTO textures (texture_hash, variant, png) VALUES (?, 'cape_back', ?)", (cape_hash, base64.b64decode(cape_back_b64))
+                )
+
+        cursor.execute("UPDATE mojang_cache SET skin_hash = ?, cape_hash = ? WHERE uuid = ?", (skin_hash, cape_hash, uuid))
+
+def _index_guild_members(cursor: sqlite3.Cursor) -> None:
+    """migration 7: fills guild_members from the guilds that are already cached"""
+    rows = cursor.execute("SELECT guild_id, member_uuids, roster FROM hypixel_guild_cache WHERE guild_id IS NOT NULL").fetchall()
+    for guild_id, member_uuids, roster in rows:
+        if roster is not None:
+            members = [(guild_id, member["uuid"], member.get("rank"), member.get("joined")) for member in json.loads(roster)]
+        else:
+            members = [(guild_id, uuid, None, None) for uuid in json.loads(member_uuids or "[]")]
+        cursor.executemany("INSERT OR IGNORE INTO guild_members (guild_id, uuid, rank, joined) VALUES (?, ?, ?, ?)", members)
+
+# schema migrations, applied in order on top of the original tables
+# the version a cache.db is at is stored in the schema_version table
+# a step is either an SQL statement or a function that takes the cursor
+SCHEMA_MIGRATIONS = {
+    2: [ # indexed lowercase username, so name lookups don't scan the whole table
+        "ALTER TABLE mojang_cache ADD COLUMN username_lower TEXT",
+        "UPDATE mojang_cache SET username_lower = LOWER(username)",
+        "CREATE INDEX IF NOT EXISTS idx_mojang_cache_username_lower ON mojang_cache (username_lower)"
+    ],
+    3: [ # textures are stored once as png blobs, keyed by texture hash, and referenced from mojang_cache
+        """CREATE TABLE IF NOT EXISTS textures (
+            texture_hash TEXT NOT NULL,
+            variant TEXT NOT NULL,
+            png BLOB NOT NULL,
+            PRIMARY KEY (texture_hash, variant))""",
+        "ALTER TABLE mojang_cache ADD COLUMN skin_hash TEXT",
+        "ALTER TABLE mojang_cache ADD COLUMN cape_hash TEXT",
+        _move_textures_to_blob_store,
+        # the old columns are emptied rather than dropped, DROP COLUMN needs sqlite 3.35+
+        "UPDATE mojang_cache SET skin_showcase_b64 = NULL, cape_front_b64 = NULL, cape_back_b64 = NULL"
+    ],
+    4: [ # lookups that came back as "doesn't exist", so they aren't repeated on every search
+        """CREATE TABLE IF NOT EXISTS negative_cache (
+            kind TEXT NOT NULL,
+            lookup_key TEXT NOT NULL,
+            reason TEXT NOT NULL,
+            timestamp INTEGER NOT NULL,
+            PRIMARY KEY (kind, lookup_key))"""
+    ],
+    5: [ # guild membership is refreshed separately from the player's rank and first login
+        "ALTER TABLE hypixel_player_cache ADD COLUMN guild_timestamp INTEGER NOT NULL DEFAULT 0",
+        "UPDATE hypixel_player_cache SET guild_timestamp = timestamp",
+        "DELETE FROM hypixel_guild_cache WHERE guild_id IS NULL" # written for players without a guild by older versions
+    ],
+    6: [ # the full guild roster: every member's uuid, rank, join date and exp history
+        "ALTER TABLE hypixel_guild_cache ADD COLUMN roster TEXT"
+    ],
+    7: [ # guild members as rows, so "which guild is this player in" doesn't need to load every roster
+        """CREATE TABLE IF NOT EXISTS guild_members (
+            guild_id TEXT NOT NULL,
+            uuid TEXT NOT NULL,
+            rank TEXT,
+            joined INTEGER,
+            PRIMARY KEY (guild_id, uuid))""",
+        "CREATE INDEX IF NOT EXISTS idx_guild_members_uuid ON guild_members (uuid)",
+        _index_guild_members
+    ],
+    8: [ # colours of a texture (average and dominant), computed once per texture hash for the cape gradient
+        """CREATE TABLE IF NOT EXISTS texture_colors (
+            texture_hash TEXT NOT NULL,
+            variant TEXT NOT NULL,
+            average TEXT,
+            dominant TEXT,
+            PRIMARY KEY (texture_hash, variant))"""
+    ],
+    9: [ # favorites, moved here from favorites.json, the skin is a reference into textures
+        """CREATE TABLE IF NOT EXISTS favorites (
+            uuid TEXT PRIMARY KEY,
+            username TEXT NOT NULL,
+            skin_hash TEXT,
+            added INTEGER NOT NULL)"""
+    ]
+}
+
+# kinds of negative_cache rows
+NEGATIVE_MOJANG = "mojang" # no player with this name / uuid
+NEGATIVE_HYPIXEL_PLAYER = "hypixel_player" # player never joined hypixel
+NEGATIVE_HYPIXEL_GUILD = "hypixel_guild" # player isn't in a guild
+SCHEMA_VERSION = max(SCHEMA_MIGRATIONS)
+
+UUID_PATTERN = re.compile(r"^[0-9a-fA-F]{32}$")
+
+def normalize_uuid(search_term: str) -> str | None:
+    """returns the undashed lowercase uuid if search_term is a uuid, None if it's a username"""
+    undashed = search_term.replace("-", "")
+    if UUID_PATTERN.match(undashed):
+        return undashed.lower()
+    return None
+
 class CacheManager:
     """
     Manages caching of Mojang and Hypixel data using SQLite.
-    Currently, there are three tables:
-    - mojang_cache: Stores Mojang data including UUID, username, cape information, and timestamps.
+    Currently, there are eight tables (plus schema_version, see SCHEMA_MIGRATIONS):
+    - mojang_cache: Stores Mojang data including UUID, username, cape information, texture hashes and timestamps.
+    - textures: Stores skin and cape images once as png blobs, keyed by texture hash and variant.
+    - texture_colors: Stores the average and dominant colour of a texture, keyed like textures.
+    - negative_cache: Stores lookups that found nothing (unknown player, no hypixel profile, no guild).
     - hypixel_player_cache: Stores Hypixel player data including UUID, first login, rank, guild ID, and timestamps.
-    - hypixel_guild_cache: Stores Hypixel guild data including guild ID, guild name, member UUIDs, and timestamps.
+    - hypixel_guild_cache: Stores Hypixel guild data including guild ID, guild name, member UUIDs, the full roster and timestamps.
+    - guild_members: One row per cached guild member (guild ID, UUID, guild rank, join date), indexed both ways.
+    - favorites: The user's favorite players (UUID, username, skin texture hash), kept when the cache is cleared.
+    One connection is opened and the schema is prepared once, the instance is meant to be long-lived
+    (see get_cache_manager) and can be used from multiple threads.
+    Writes are queued and committed in batches by a background thread, reads flush the queue first
+    so they always see earlier writes, and close() flushes whatever is left.
+    Rows that were read or written recently are kept in in-memory LRU tiers, so repeated lookups
+    (e.g. clicking back and forth between guildmates) don't touch the database.
     """
-    def __init__(self):
-        self.conn = sqlite3.Connection(current_directory / "storage" / "cache.db")
+    def __init__(self, db_path: Path = current_directory / "storage" / "cache.db", storage_profile: dict = None, ttl_policy: dict = None):
+        db_path.parent.mkdir(parents = True, exist_ok = True)
+        self.storage_profile = {**DEFAULT_STORAGE_PROFILE, **(storage_profile or {})}
+        self.ttl_policy = {table: {**fields, **(ttl_policy or {}).get(table, {})} for table, fields in DEFAULT_TTL_POLICY.items()}
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(db_path, check_same_thread = False)
         self.cursor = self.conn.cursor()
+        self._apply_storage_profile()
+
+        self.pending_writes = [] # (query, params, is_executemany)
+        self.flush_requested = threading.Event()
+        self.closed = False
+
+        memory_cache_size = self.storage_profile["memory_cache_size"]
+        memory_cache_ttl = self.storage_profile["memory_cache_ttl"]
+        self.mojang_memory = LRUTTLCache(memory_cache_size, memory_cache_ttl) # uuid -> full mojang row
+        self.mojang_name_memory = LRUTTLCache(memory_cache_size, memory_cache_ttl) # lowercase username -> uuid
+        self.username_memory = LRUTTLCache(memory_cache_size, memory_cache_ttl) # uuid -> username
+        self.hypixel_player_memory = LRUTTLCache(memory_cache_size, memory_cache_ttl) # uuid -> hypixel player row
+        self.hypixel_guild_memory = LRUTTLCache(memory_cache_size, memory_cache_ttl) # guild id -> hypixel guild row
+        self.texture_memory = LRUTTLCache(memory_cache_size, memory_cache_ttl) # (texture hash, variant) -> b64 image
+        self.texture_color_memory = LRUTTLCache(memory_cache_size, memory_cache_ttl) # (texture hash, variant) -> colours
+        self.negative_memory = LRUTTLCache(memory_cache_size, memory_cache_ttl) # (kind, lookup key) -> negative row
 
         self.cursor.execute("""
         CREATE TABLE IF NOT EXISTS mojang_cache (
@@ -48,155 +248,632 @@ class CacheManager:
             member_uuids TEXT,
             timestamp INTEGER NOT NULL);
         """)
+        self.conn.commit()
+        self._migrate_schema()
+        logger.info(f"Opened cache at {db_path}")
 
-    def check_mojang_cache(self, search_term: str, time_between_cache: int = 360):
+        self.flush_thread = threading.Thread(target = self._flush_loop, daemon = True)
+        self.flush_thread.start()
+
+    def _apply_storage_profile(self) -> None:
+        profile = self.storage_profile
+        journal_mode = self.cursor.execute(f"PRAGMA journal_mode = {profile['journal_mode']}").fetchone()[0]
+        self.cursor.execute(f"PRAGMA synchronous = {profile['synchronous']}")
+        self.cursor.execute(f"PRAGMA mmap_size = {int(profile['mmap_size'])}")
+        self.cursor.execute(f"PRAGMA cache_size = {int(profile['cache_size'])}")
+        self.cursor.execute(f"PRAGMA busy_timeout = {int(profile['busy_timeout'])}")
+        logger.info(f"Cache journal mode: {journal_mode}")
+
+    def _migrate_schema(self) -> None:
+        """upgrades an existing cache.db in place to SCHEMA_VERSION"""
+        self.cursor.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+        row = self.cursor.execute("SELECT version FROM schema_version").fetchone()
+        if row is None:
+            self.cursor.execute("INSERT INTO schema_version (version) VALUES (1)") # original schema
+            self.conn.commit()
+            current_version = 1
+        else:
+            current_version = row[0]
+
+        for version in sorted(SCHEMA_MIGRATIONS):
+            if version <= current_version:
+                continue
+            logger.info(f"Migrating cache schema from version {current_version} to {version}")
+            self._run_migration(version)
+            current_version = version
+
+    def _run_migration(self, version: int) -> None:
         """
-        Check if Mojang cache is valid for a given UUID or username.
-        Returns True if cache is valid, False otherwise.
+        runs one migration and its version bump in a single transaction, a failed step rolls back the whole migration
+        sqlite3 doesn't open a transaction before ALTER / CREATE on its own, so it's started explicitly here
         """
-        results = self.cursor.execute("SELECT timestamp FROM mojang_cache WHERE uuid = ? OR LOWER(username) = ?", (search_term.lower(), search_term.lower(),)).fetchall()
+        isolation_level = self.conn.isolation_level
+        self.conn.isolation_level = None
         try:
-            last_timestamp = results[0][0]
-            print(last_timestamp)
-            if self._is_cache_valid(last_timestamp, time_between_cache):
-                logger.info(f"Cache found for UUID: {search_term}, returning True")
-                return True
-            else:
-                logger.info(f"Cache expired for UUID: {search_term}, returning False")
-                return False
-        except IndexError:
-            logger.info(f"No cache found for UUID: {search_term}")
-            return False
-        
-    
-    def get_data_from_mojang_cache(self, search_term: str):
-        """Retrieve Mojang cache data for a given UUID or username."""
-        
-        self.cursor.execute("SELECT * FROM mojang_cache WHERE uuid = ? OR LOWER(username) = ?", (search_term.lower(), search_term.lower(),))
-        results = self.cursor.fetchone()
-        
-        if results:
-            logger.info(f"Cache found for search term: {search_term}")
-            return {
+            self.cursor.execute("BEGIN")
+            try:
+                for statement in SCHEMA_MIGRATIONS[version]:
+                    if callable(statement):
+                        statement(self.cursor)
+                    else:
+                        self.cursor.execute(statement)
+                self.cursor.execute("UPDATE schema_version SET version = ?", (version,))
+            except Exception:
+                self.cursor.execute("ROLLBACK")
+                raise
+            self.cursor.execute("COMMIT")
+        finally:
+            self.conn.isolation_level = isolation_level
+
+    def _mojang_lookup_clause(self, search_term: str) -> tuple[str, tuple]:
+        """uuids are matched on the primary key, names on the indexed username_lower column"""
+        uuid = normalize_uuid(search_term)
+        if uuid is not None:
+            return "uuid = ?", (uuid,)
+        return "username_lower = ?", (search_term.lower(),)
+
+    def _queue_write(self, query: str, params, many: bool = False) -> None:
+        """queues a write, it's committed with the next batch (caller must hold the lock)"""
+        self.pending_writes.append((query, params, many))
+        if len(self.pending_writes) >= self.storage_profile["max_pending_writes"]:
+            self.flush_requested.set()
+
+    def _flush_pending_writes(self) -> None:
+        """commits all queued writes in a single transaction (caller must hold the lock)"""
+        if not self.pending_writes:
+            return
+        writes, self.pending_writes = self.pending_writes, []
+        try:
+            with self.conn:
+                for write in writes:
+                    self._execute_write(*write)
+            logger.debug(f"Flushed {len(writes)} cache writes")
+        except sqlite3.Error as e:
+            # the batch was rolled back, retry every write on its own so one bad write doesn't lose the others
+            logger.warning(f"Couldn't flush {len(writes)} cache writes as one batch, retrying them one by one: {e}")
+            failed = 0
+            for write in writes:
+                try:
+                    with self.conn:
+                        self._execute_write(*write)
+                except sqlite3.Error as e:
+                    failed += 1
+                    logger.error(f"Dropped cache write {write[0]!r}: {e}")
+            logger.debug(f"Flushed {len(writes) - failed} of {len(writes)} cache writes")
+
+    def _execute_write(self, query: str, params, many: bool) -> None:
+        if many:
+            self.cursor.executemany(query, params)
+        else:
+            self.cursor.execute(query, params)
+
+    @synchronized
+    def flush(self) -> None:
+        self._flush_pending_writes()
+
+    def _flush_loop(self) -> None:
+        while not self.closed:
+            self.flush_requested.wait(self.storage_profile["flush_interval"])
+            self.flush_requested.clear()
+            with self.lock:
+                if not self.closed:
+                    self._flush_pending_writes()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @synchronized
+    def get_mojang_cache_entry(self, search_term: str, time_between_cache: int = 360) -> dict | None:
+        """
+        Retrieve Mojang cache data for a given UUID or username together with its freshness, in one query.
+        Returns None if there is no cache, otherwise the cached row with an added "is_fresh" key.
+        """
+        uuid = normalize_uuid(search_term)
+        if uuid is None:
+            uuid = self.mojang_name_memory.get(search_term.lower())
+        cached_row = self.mojang_memory.get(uuid) if uuid is not None else None
+
+        if cached_row is None:
+            self._flush_pending_writes()
+            # name-only rows (added while resolving guild members) have no skin and don't count as a full profile
+            lookup_clause, lookup_params = self._mojang_lookup_clause(search_term)
+            results = self.cursor.execute(
+                f"""SELECT m.uuid, m.username, m.has_cape, m.cape_name, m.skin_hash, m.cape_hash, m.timestamp,
+                    skin.png, cape_front.png, cape_back.png
+                FROM mojang_cache m
+                LEFT JOIN textures skin ON skin.texture_hash = m.skin_hash AND skin.variant = 'skin_showcase'
+                LEFT JOIN textures cape_front ON cape_front.texture_hash = m.cape_hash AND cape_front.variant = 'cape_front'
+                LEFT JOIN textures cape_back ON cape_back.texture_hash = m.cape_hash AND cape_back.variant = 'cape_back'
+                WHERE m.{lookup_clause} AND m.skin_hash IS NOT NULL
+                ORDER BY m.timestamp DESC LIMIT 1""",
+                lookup_params
+                ).fetchone()
+
+            if not results:
+                logger.info(f"No cache found for search term: {search_term}")
+                return None
+
+            cached_row = {
                 "uuid": results[0],
                 "username": results[1],
                 "has_cape": results[2],
                 "cape_name": results[3],
-                "skin_showcase_b64": results[4],
-                "cape_front_b64": results[5],
-                "cape_back_b64": results[6],
-                "timestamp": results[7]
+                "skin_hash": results[4],
+                "cape_hash": results[5],
+                "skin_showcase_b64": self._png_to_b64(results[7]),
+                "cape_front_b64": self._png_to_b64(results[8]),
+                "cape_back_b64": self._png_to_b64(results[9]),
+                "timestamp": results[6]
             }
-        else:
-            logger.info(f"No cache found for UUID: {search_term}")
-            return None
+            self._remember_mojang_row(cached_row)
 
+        cache_entry = self._with_freshness("mojang_cache", cached_row, time_between_cache)
+        logger.info(f"Cache found for search term: {search_term}, stale fields: {cache_entry['stale_fields']}")
+        return cache_entry
+
+    def _remember_mojang_row(self, row: dict) -> None:
+        """keeps a full mojang row in memory (caller must hold the lock)"""
+        self.mojang_memory.set(row["uuid"], row)
+        self.mojang_name_memory.set(row["username"].lower(), row["uuid"])
+        self.username_memory.set(row["uuid"], row["username"])
+
+    def check_mojang_cache(self, search_term: str, time_between_cache: int = 360):
+        """
+        Check if Mojang cache is valid for a given UUID or username.
+        Returns True if cache is valid, False otherwise.
+        """
+        cache_entry = self.get_mojang_cache_entry(search_term, time_between_cache)
+        return cache_entry is not None and cache_entry["is_fresh"]
+    
+    def get_data_from_mojang_cache(self, search_term: str):
+        """Retrieve Mojang cache data for a given UUID or username."""
+        return self.get_mojang_cache_entry(search_term)
+
+    @synchronized
     def add_mojang_cache(
             self, uuid: str, username: str, has_cape: bool = False, cape_name: str = None,
-            skin_showcase_b64: str = None, cape_front_b64: str = None, cape_back_b64: str = None
+            skin_showcase_b64: str = None, cape_front_b64: str = None, cape_back_b64: str = None,
+            skin_hash: str = None, cape_hash: str = None
             ):
-        """Add or update Mojang cache data for a given UUID."""
+        """
+        Add or update Mojang cache data for a given UUID.
+        Images are stored once in the textures table under skin_hash / cape_hash
+        (the texture url hashes), a hash of the image is used if they aren't given.
+        Hashes without images (a lookup that skipped textures) are stored too, the row then
+        picks up the images if that texture is stored by another player.
+        """
+        if skin_showcase_b64 is not None:
+            skin_hash = self._queue_texture(skin_hash, "skin_showcase", skin_showcase_b64)
 
-        self.cursor.execute(
-            """INSERT OR REPLACE INTO mojang_cache (uuid, username, has_cape, cape_name, skin_showcase_b64, cape_front_b64, cape_back_b64, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?, strftime('%s', 'now'))""", (uuid, username, has_cape, cape_name, skin_showcase_b64, cape_front_b64, cape_back_b64))
-        self.conn.commit()
+        if cape_front_b64 is not None and cape_back_b64 is not None:
+            cape_hash = self._queue_texture(cape_hash, "cape_front", cape_front_b64)
+            self._queue_texture(cape_hash, "cape_back", cape_back_b64)
+
+        timestamp = int(time.time())
+        self._queue_write(
+            """INSERT OR REPLACE INTO mojang_cache (uuid, username, username_lower, has_cape, cape_name, skin_hash, cape_hash, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (uuid, username, username.lower(), has_cape, cape_name, skin_hash, cape_hash, timestamp)
+            )
+        if skin_showcase_b64 is not None: # rows without images are only read back from the database, with the textures joined in
+            self._remember_mojang_row({
+                "uuid": uuid,
+                "username": username,
+                "has_cape": has_cape,
+                "cape_name": cape_name,
+                "skin_hash": skin_hash,
+                "cape_hash": cape_hash,
+                "skin_showcase_b64": skin_showcase_b64,
+                "cape_front_b64": cape_front_b64,
+                "cape_back_b64": cape_back_b64,
+                "timestamp": timestamp
+            })
+
+    def _queue_texture(self, texture_hash: str | None, variant: str, image_b64: str) -> str:
+        """queues a texture write (a no-op if it's already stored), returns the hash it's stored under"""
+        png_bytes = base64.b64decode(image_b64)
+        if texture_hash is None:
+            texture_hash = content_hash(png_bytes)
+        if self.texture_memory.get((texture_hash, variant)) is None:
+            self._queue_write(
+                "INSERT OR IGNORE INTO textures (texture_hash, variant, png) VALUES (?, ?, ?)", (texture_hash, variant, png_bytes)
+                )
+            self.texture_memory.set((texture_hash, variant), image_b64)
+        return texture_hash
+
+    @synchronized
+    def get_texture_b64(self, texture_hash: str, variant: str) -> str | None:
+        """
+        Returns a stored texture as a base64 string, or None if it isn't stored
+        variant is "skin_showcase", "cape_front" or "cape_back"
+        """
+        if texture_hash is None:
+            return None
+        image_b64 = self.texture_memory.get((texture_hash, variant))
+        if image_b64 is not None:
+            return image_b64
+
+        self._flush_pending_writes()
+        results = self.cursor.execute(
+            "SELECT png FROM textures WHERE texture_hash = ? AND variant = ?", (texture_hash, variant)
+            ).fetchone()
+        if not results:
+            return None
+
+        image_b64 = self._png_to_b64(results[0])
+        self.texture_memory.set((texture_hash, variant), image_b64)
+        return image_b64
+
+    @synchronized
+    def get_textures_b64(self, texture_hashes: list[str], variant: str) -> dict:
+        """
+        Many textures of one variant at once, in a single query for the ones that aren't in memory.
+        Returns texture hash -> base64 string, textures that aren't stored are left out
+        """
+        textures = {}
+        missing_hashes = []
+        for texture_hash in set(texture_hashes):
+            if texture_hash is None:
+                continue
+            image_b64 = self.texture_memory.get((texture_hash, variant))
+            if image_b64 is not None:
+                textures[texture_hash] = image_b64
+            else:
+                missing_hashes.append(texture_hash)
+
+        if not missing_hashes:
+            return textures
+        self._flush_pending_writes()
+
+        placeholders = ','.join('?' for _ in missing_hashes)
+        query = f"SELECT texture_hash, png FROM textures WHERE variant = ? AND texture_hash IN ({placeholders})"
+        for texture_hash, png_bytes in self.cursor.execute(query, (variant, *missing_hashes)).fetchall():
+            image_b64 = self._png_to_b64(png_bytes)
+            textures[texture_hash] = image_b64
+            self.texture_memory.set((texture_hash, variant), image_b64)
+        return textures
+
+    @synchronized
+    def get_texture_colors(self, texture_hash: str, variant: str) -> dict | None:
+        """Returns {"average": hex, "dominant": hex} for a texture, or None if they weren't computed yet"""
+        if texture_hash is None:
+            return None
+        colors = self.texture_color_memory.get((texture_hash, variant))
+        if colors is not None:
+            return colors
+
+        self._flush_pending_writes()
+        results = self.cursor.execute(
+            "SELECT average, dominant FROM texture_colors WHERE texture_hash = ? AND variant = ?", (texture_hash, variant)
+            ).fetchone()
+        if not results:
+            return None
+
+        colors = {"average": results[0], "dominant": results[1]}
+        self.texture_color_memory.set((texture_hash, variant), colors)
+        return colors
+
+    @synchronized
+    def add_texture_colors(self, colors_by_hash: dict, variant: str) -> None:
+        """Stores colours for many textures at once, colors_by_hash maps texture hash -> {"average": hex, "dominant": hex}"""
+        self._queue_write(
+            "INSERT OR REPLACE INTO texture_colors (texture_hash, variant, average, dominant) VALUES (?, ?, ?, ?)",
+            [(texture_hash, variant, colors["average"], colors["dominant"]) for texture_hash, colors in colors_by_hash.items()],
+            many = True
+            )
+        for texture_hash, colors in colors_by_hash.items():
+            self.texture_color_memory.set((texture_hash, variant), colors)
+
+    @synchronized
+    def get_favorites(self) -> list[dict]:
+        """Every favorite as {"uuid", "username", "skin_hash"}, in the order they were added"""
+        self._flush_pending_writes()
+        results = self.cursor.execute("SELECT uuid, username, skin_hash FROM favorites ORDER BY added, rowid").fetchall()
+        return [{"uuid": uuid, "username": username, "skin_hash": skin_hash} for uuid, username, skin_hash in results]
+
+    @synchronized
+    def add_favorite(self, uuid: str, username: str, skin_showcase_b64: str = None, skin_hash: str = None) -> str | None:
+        """
+        Adds a favorite or updates its username and skin, the skin is stored in textures.
+        Returns the hash the skin is stored under.
+        """
+        if skin_showcase_b64 is not None:
+            skin_hash = self._queue_texture(skin_hash, "skin_showcase", skin_showcase_b64)
+        self._queue_write(
+            """INSERT INTO favorites (uuid, username, skin_hash, added) VALUES (?, ?, ?, ?)
+            ON CONFLICT(uuid) DO UPDATE SET username = excluded.username, skin_hash = excluded.skin_hash""",
+            (uuid, username, skin_hash, int(time.time()))
+            )
+        return skin_hash
+
+    @synchronized
+    def remove_favorite(self, uuid: str) -> None:
+        self._queue_write("DELETE FROM favorites WHERE uuid = ?", (uuid,))
+
+    def _png_to_b64(self, png_bytes: bytes | None) -> str | None:
+        if png_bytes is None:
+            return None
+        return base64.b64encode(png_bytes).decode("utf-8")
+    
+    @synchronized
+    def add_mojang_usernames(self, usernames: dict) -> None:
+        """
+        Adds name-only rows for a dictionary mapping UUIDs to usernames, in a single transaction.
+        Existing rows only get their username updated, so cached skins and capes are kept.
+        """
+        timestamp = int(time.time())
+        self._queue_write(
+            """INSERT INTO mojang_cache (uuid, username, username_lower, has_cape, timestamp)
+            VALUES (?, ?, ?, FALSE, ?)
+            ON CONFLICT(uuid) DO UPDATE SET username = excluded.username, username_lower = excluded.username_lower""",
+            [(uuid, username, username.lower(), timestamp) for uuid, username in usernames.items()],
+            many = True
+        )
+        for uuid, username in usernames.items():
+            self.username_memory.set(uuid, username)
+            self.mojang_memory.invalidate(uuid) # the full row (if any) now has a different username
+        logger.info(f"Added {len(usernames)} usernames to cache")
     
+    @synchronized
     def add_hypixel_cache(self, uuid, hypixel_data: dict):
+        """adds a full hypixel lookup, the player's rank and first login and their guild"""
         if hypixel_data["status"] != "success":
             logger.warning(f"Invalid Hypixel data for UUID {uuid}: {hypixel_data['status']}, cache not updated")
             return
-        self.cursor.execute(
-            """INSERT OR REPLACE INTO hypixel_player_cache (uuid, first_login, rank, guild_id, timestamp)
-            VALUES (?, ?, ?, ?, strftime('%s', 'now'))""", 
-            (uuid, hypixel_data["first_login"], hypixel_data["player_rank"], hypixel_data["guild_id"])
+        self.add_hypixel_player_cache(uuid, hypixel_data["first_login"], hypixel_data["player_rank"])
+        self.add_hypixel_guild_membership(
+            uuid, hypixel_data["guild_id"], hypixel_data["guild_name"], hypixel_data["member_uuids"], hypixel_data.get("roster")
+            )
+
+        timestamp = int(time.time())
+        self.hypixel_player_memory.set(uuid, {
+            "uuid": uuid,
+            "first_login": hypixel_data["first_login"],
+            "rank": hypixel_data["player_rank"],
+            "guild_id": hypixel_data["guild_id"],
+            "timestamp": timestamp,
+            "guild_timestamp": timestamp
+        })
+
+    @synchronized
+    def add_hypixel_player_cache(self, uuid: str, first_login: str, player_rank: str) -> None:
+        """adds or updates a player's first login and rank, their guild membership is kept"""
+        timestamp = int(time.time())
+        self._queue_write(
+            """INSERT INTO hypixel_player_cache (uuid, first_login, rank, timestamp, guild_timestamp)
+            VALUES (?, ?, ?, ?, 0)
+            ON CONFLICT(uuid) DO UPDATE SET first_login = excluded.first_login, rank = excluded.rank, timestamp = excluded.timestamp""",
+            (uuid, first_login, player_rank, timestamp)
         )
 
-        #logger.info(hypixel_data)
-        json_guild_members = json.dumps(hypixel_data["member_uuids"])
-        
+        player_row = self.hypixel_player_memory.get(uuid)
+        if player_row is not None: # otherwise the guild membership isn't known here, the next read loads the row
+            self.hypixel_player_memory.set(uuid, {**player_row, "first_login": first_login, "rank": player_rank, "timestamp": timestamp})
+
+    @synchronized
+    def add_hypixel_guild_membership(
+            self, uuid: str, guild_id: str | None, guild_name: str = None, member_uuids: list[str] = None, roster: list[dict] = None
+            ) -> None:
+        """
+        Updates which guild a cached player is in (guild_id None for no guild) and caches that guild.
+        roster is the full member list ({"uuid", "rank", "joined", "exp_history"}), see GetHypixelData.guild_roster
+        The player has to be cached already, see add_hypixel_player_cache.
+        """
+        timestamp = int(time.time())
+        self.set_hypixel_player_guild(uuid, guild_id, timestamp)
+        if guild_id is None:
+            return
+
+        json_guild_members = json.dumps(member_uuids)
         logger.info(f"Adding Hypixel guild cache for UUID {uuid} with members: {json_guild_members}")
 
-        self.cursor.execute(
-            """INSERT OR REPLACE INTO hypixel_guild_cache (guild_id, guild_name, member_uuids, timestamp)
-            VALUES (?, ?, ?, strftime('%s', 'now'))""", 
-            (hypixel_data["guild_id"], hypixel_data["guild_name"], json_guild_members)
+        self._queue_write(
+            """INSERT OR REPLACE INTO hypixel_guild_cache (guild_id, guild_name, member_uuids, roster, timestamp)
+            VALUES (?, ?, ?, ?, ?)""", 
+            (guild_id, guild_name, json_guild_members, json.dumps(roster) if roster is not None else None, timestamp)
         )
-        self.conn.commit()
-    
+        self.hypixel_guild_memory.set(guild_id, {
+            "guild_id": guild_id,
+            "guild_name": guild_name,
+            "member_uuids": member_uuids,
+            "roster": roster,
+            "timestamp": timestamp
+        })
+
+        if roster is not None:
+            members = [(guild_id, member["uuid"], member.get("rank"), member.get("joined")) for member in roster]
+        else:
+            members = [(guild_id, member_uuid, None, None) for member_uuid in member_uuids or []]
+        self._queue_write("DELETE FROM guild_members WHERE guild_id = ?", (guild_id,))
+        self._queue_write("INSERT OR IGNORE INTO guild_members (guild_id, uuid, rank, joined) VALUES (?, ?, ?, ?)", members, many = True)
+
+    @synchronized
+    def set_hypixel_player_guild(self, uuid: str, guild_id: str | None, guild_timestamp: int) -> None:
+        """
+        Sets which guild a cached player is in, guild_timestamp is when that was last known to be true
+        (e.g. the timestamp of a cached guild the player was found in)
+        """
+        self._queue_write(
+            "UPDATE hypixel_player_cache SET guild_id = ?, guild_timestamp = ? WHERE uuid = ?", (guild_id, guild_timestamp, uuid)
+        )
+        player_row = self.hypixel_player_memory.get(uuid)
+        if player_row is not None:
+            self.hypixel_player_memory.set(uuid, {**player_row, "guild_id": guild_id, "guild_timestamp": guild_timestamp})
+
+    @synchronized
+    def get_guild_for_member(self, uuid: str, time_between_cache: int = 720) -> dict | None:
+        """
+        Finds the cached guild a player is a member of, even if the player itself isn't cached.
+        Returns None if no cached guild lists them, otherwise the guild cache entry (see get_hypixel_guild_cache_entry).
+        """
+        self._flush_pending_writes()
+        results = self.cursor.execute(
+            """SELECT m.guild_id FROM guild_members m JOIN hypixel_guild_cache g ON g.guild_id = m.guild_id
+            WHERE m.uuid = ? ORDER BY g.timestamp DESC LIMIT 1""",
+            (uuid,)
+            ).fetchone()
+        if not results:
+            return None
+        return self.get_hypixel_guild_cache_entry(results[0], time_between_cache)
+
+    @synchronized
+    def get_hypixel_cache_entry(self, uuid: str, time_between_cache: int = 360, guild_time_between_cache: int = 720) -> dict | None:
+        """
+        Retrieve Hypixel player cache data and the player's guild cache data for a given UUID, in one joined query.
+        Returns None if the player isn't cached, otherwise the player row with an added "is_fresh" key and
+        a "guild" key, which is None if the guild isn't cached (or the player has no guild),
+        otherwise the guild row with its own "is_fresh" key.
+        """
+        player_row = self.hypixel_player_memory.get(uuid)
+        guild_row = None
+        if player_row is not None and player_row["guild_id"] is not None:
+            guild_row = self.hypixel_guild_memory.get(player_row["guild_id"])
+
+        if player_row is None or (player_row["guild_id"] is not None and guild_row is None):
+            self._flush_pending_writes()
+            results = self.cursor.execute(
+                """SELECT p.uuid, p.first_login, p.rank, p.guild_id, p.timestamp, g.guild_id, g.guild_name, g.member_uuids, g.timestamp,
+                    p.guild_timestamp, g.roster
+                FROM hypixel_player_cache p LEFT JOIN hypixel_guild_cache g ON g.guild_id = p.guild_id
+                WHERE p.uuid = ?""",
+                (uuid,)
+                ).fetchone()
+
+            if not results:
+                logger.info(f"No cache found for UUID: {uuid}")
+                return None
+
+            player_row = {
+                "uuid": results[0],
+                "first_login": results[1],
+                "rank": results[2],
+                "guild_id": results[3],
+                "timestamp": results[4],
+                "guild_timestamp": results[9]
+            }
+            self.hypixel_player_memory.set(uuid, player_row)
+
+            if results[5] is not None:
+                guild_row = {
+                    "guild_id": results[5],
+                    "guild_name": results[6],
+                    "member_uuids": json.loads(results[7]),
+                    "roster": json.loads(results[10]) if results[10] is not None else None,
+                    "timestamp": results[8]
+                }
+                self.hypixel_guild_memory.set(guild_row["guild_id"], guild_row)
+
+        guild_cache_entry = None
+        if guild_row is not None:
+            guild_cache_entry = self._with_freshness("hypixel_guild_cache", guild_row, guild_time_between_cache)
+
+        cache_entry = self._with_freshness("hypixel_player_cache", player_row, time_between_cache)
+        logger.info(f"Cache found for UUID: {uuid}, stale fields: {cache_entry['stale_fields']}")
+        return {**cache_entry, "guild": guild_cache_entry}
+
+    @synchronized
+    def get_hypixel_guild_cache_entry(self, guild_id: str, time_between_cache: int = 720) -> dict | None:
+        """
+        Retrieve Hypixel guild cache data for a given guild ID together with its freshness, in one query.
+        Returns None if there is no cache, otherwise the cached row with an added "is_fresh" key.
+        """
+        guild_row = self.hypixel_guild_memory.get(guild_id)
+        if guild_row is None:
+            self._flush_pending_writes()
+            results = self.cursor.execute(
+                "SELECT guild_id, guild_name, member_uuids, timestamp, roster FROM hypixel_guild_cache WHERE guild_id = ?", (guild_id,)
+                ).fetchone()
+
+            if not results:
+                logger.info(f"No cache found for guild ID: {guild_id}")
+                return None
+
+            guild_row = {
+                "guild_id": results[0],
+                "guild_name": results[1],
+                "member_uuids": json.loads(results[2]),
+                "roster": json.loads(results[4]) if results[4] is not None else None,
+                "timestamp": results[3]
+            }
+            self.hypixel_guild_memory.set(guild_id, guild_row)
+
+        return self._with_freshness("hypixel_guild_cache", guild_row, time_between_cache)
+
+    def _negative_key(self, lookup_key: str) -> str:
+        """uuids are stored undashed, names lowercase"""
+        return normalize_uuid(lookup_key) or lookup_key.lower()
+
+    @synchronized
+    def add_negative_cache(self, kind: str, lookup_key: str, reason: str = "not_found") -> None:
+        """
+        Remembers that a lookup found nothing, kind is one of the NEGATIVE_ constants.
+        Only add results that mean "doesn't exist", not timeouts or rate limits.
+        """
+        lookup_key = self._negative_key(lookup_key)
+        timestamp = int(time.time())
+        self._queue_write(
+            "INSERT OR REPLACE INTO negative_cache (kind, lookup_key, reason, timestamp) VALUES (?, ?, ?, ?)",
+            (kind, lookup_key, reason, timestamp)
+            )
+        self.negative_memory.set((kind, lookup_key), {"kind": kind, "lookup_key": lookup_key, "reason": reason, "timestamp": timestamp})
+        logger.info(f"Added negative cache for {kind}: {lookup_key} ({reason})")
+
+    @synchronized
+    def get_negative_cache_entry(self, kind: str, lookup_key: str, time_between_cache: int = 60) -> dict | None:
+        """
+        Retrieve a negative result together with its freshness.
+        Returns None if there is none, otherwise the cached row with an added "is_fresh" key.
+        """
+        lookup_key = self._negative_key(lookup_key)
+        negative_row = self.negative_memory.get((kind, lookup_key))
+        if negative_row is None:
+            self._flush_pending_writes()
+            results = self.cursor.execute(
+                "SELECT reason, timestamp FROM negative_cache WHERE kind = ? AND lookup_key = ?", (kind, lookup_key)
+                ).fetchone()
+            if not results:
+                return None
+
+            negative_row = {"kind": kind, "lookup_key": lookup_key, "reason": results[0], "timestamp": results[1]}
+            self.negative_memory.set((kind, lookup_key), negative_row)
+
+        return {**negative_row, "is_fresh": self._is_cache_valid(negative_row["timestamp"], time_between_cache)}
+
+    @synchronized
+    def remove_negative_cache(self, kind: str, lookup_key: str) -> None:
+        """forgets a negative result, e.g. once the lookup succeeds"""
+        lookup_key = self._negative_key(lookup_key)
+        self.negative_memory.invalidate((kind, lookup_key))
+        self._queue_write("DELETE FROM negative_cache WHERE kind = ? AND lookup_key = ?", (kind, lookup_key))
+
     def check_hypixel_player_cache(self, uuid: str, time_between_cache: int = 360):
         """
         Check if Hypixel player cache is valid for a given UUID.
         Returns True if cache is valid, False otherwise.
         """
-        results = self.cursor.execute("SELECT timestamp FROM hypixel_player_cache WHERE uuid = ?", (uuid,)).fetchall()
-        try:
-            last_timestamp = results[0][0]
-            if self._is_cache_valid(last_timestamp, time_between_cache):
-                logger.info(f"Cache found for UUID: {uuid}, returning True")
-                return True
-            else:
-                logger.info(f"Cache expired for UUID: {uuid}, returning False")
-                return False
-        except IndexError:
-            logger.info(f"No cache found for UUID: {uuid}")
-            return False
+        cache_entry = self.get_hypixel_cache_entry(uuid, time_between_cache)
+        return cache_entry is not None and cache_entry["is_fresh"]
     
     def get_hypixel_player_cache(self, uuid: str):
         """Retrieve Hypixel player cache data for a given UUID."""
-        
-        self.cursor.execute("SELECT * FROM hypixel_player_cache WHERE uuid = ?", (uuid,))
-        results = self.cursor.fetchone()
-        
-        if results:
-            logger.info(f"Cache found for UUID: {uuid}")
-            return {
-                "uuid": results[0],
-                "first_login": results[1],
-                "rank": results[2],
-                "guild_id": results[3],
-                "timestamp": results[4]
-            }
-        else:
-            logger.info(f"No cache found for UUID: {uuid}")
-            return None
+        return self.get_hypixel_cache_entry(uuid)
     
     def check_hypixel_guild_cache(self, guild_id: str, time_between_cache: int = 720):
         """
         Check if Hypixel guild cache is valid for a given guild ID.
         Returns True if cache is valid, False otherwise.
         """
-        results = self.cursor.execute("SELECT timestamp FROM hypixel_guild_cache WHERE guild_id = ?", (guild_id,)).fetchall()
-        try:
-            last_timestamp = results[0][0]
-            if self._is_cache_valid(last_timestamp, time_between_cache):
-                logger.info(f"Cache found for guild ID: {guild_id}, returning True")
-                return True
-            else:
-                logger.info(f"Cache expired for guild ID: {guild_id}, returning False")
-                return False
-        except IndexError:
-            logger.info(f"No cache found for guild ID: {guild_id}")
-            return False
+        cache_entry = self.get_hypixel_guild_cache_entry(guild_id, time_between_cache)
+        return cache_entry is not None and cache_entry["is_fresh"]
         
     def get_hypixel_guild_cache(self, guild_id: str):
         """Retrieve Hypixel guild cache data for a given guild ID."""
-        
-        self.cursor.execute("SELECT * FROM hypixel_guild_cache WHERE guild_id = ?", (guild_id,))
-        results = self.cursor.fetchone()
-        
-        if results:
-            logger.info(f"Cache found for guild ID: {guild_id}")
-            return {
-                "guild_id": results[0],
-                "guild_name": results[1],
-                "member_uuids": json.loads(results[2]),
-                "timestamp": results[3]
-            }
-        else:
-            logger.info(f"No cache found for guild ID: {guild_id}")
-            return None
+        return self.get_hypixel_guild_cache_entry(guild_id)
     
+    @synchronized
     def get_usernames_for_uuids_from_cache(self, uuids: list[str]) -> dict:
         """
         Retrieve usernames for a list of UUIDs from the Mojang cache.
@@ -204,32 +881,136 @@ class CacheManager:
         """
         if not uuids:
             return {}
+
+        usernames = {}
+        missing_uuids = []
+        for uuid in uuids:
+            username = self.username_memory.get(uuid)
+            if username is not None:
+                usernames[uuid] = username
+            else:
+                missing_uuids.append(uuid)
+
+        if not missing_uuids:
+            return usernames
+        self._flush_pending_writes()
         
         # This creates a query like: SELECT ... WHERE uuid IN (?, ?, ?, ...)
-        placeholders = ','.join('?' for _ in uuids)
+        placeholders = ','.join('?' for _ in missing_uuids)
         query = f"SELECT uuid, username FROM mojang_cache WHERE uuid IN ({placeholders})"
         
         try:
-            rows = self.cursor.execute(query, uuids).fetchall()
-            # This is a dictionary comprehension, a concise way to build a dict from a list.
-            return {uuid: username for uuid, username in rows}
+            rows = self.cursor.execute(query, missing_uuids).fetchall()
+            for uuid, username in rows:
+                usernames[uuid] = username
+                self.username_memory.set(uuid, username)
+            return usernames
         except Exception as e:
             logger.error(f"Error during bulk UUID lookup: {e}")
-            return {}
+            return usernames
 
     def _is_cache_valid(self, timestamp, threshold):
         return time.time() - timestamp < threshold
 
+    def _with_freshness(self, table: str, row: dict, default_ttl: int) -> dict:
+        """
+        Checks every field of a row against the TTL policy, returns the row with added keys:
+        - stale_fields: fields that should be fetched again
+        - is_fresh: True if no field is stale
+        - expires_at: when the first field goes stale, None if no field ever does
+        """
+        now = time.time()
+        stale_fields = []
+        expires_at = None
+        for field, timestamp_column in TTL_FIELDS[table].items():
+            ttl = self.ttl_policy[table].get(field, default_ttl)
+            if ttl is None:
+                continue
+            field_expires_at = row[timestamp_column] + ttl
+            if now >= field_expires_at:
+                stale_fields.append(field)
+            expires_at = field_expires_at if expires_at is None else min(expires_at, field_expires_at)
+
+        return {**row, "is_fresh": not stale_fields, "stale_fields": stale_fields, "expires_at": expires_at}
+
+    @synchronized
+    def get_memory_cache_stats(self) -> dict:
+        """hit/miss counters and size of every in-memory tier"""
+        return {
+            "mojang": self.mojang_memory.stats(),
+            "mojang_names": self.mojang_name_memory.stats(),
+            "usernames": self.username_memory.stats(),
+            "hypixel_players": self.hypixel_player_memory.stats(),
+            "hypixel_guilds": self.hypixel_guild_memory.stats(),
+            "textures": self.texture_memory.stats(),
+            "texture_colors": self.texture_color_memory.stats(),
+            "negative": self.negative_memory.stats()
+        }
+
+    def _clear_memory_cache(self) -> None:
+        self.mojang_memory.clear()
+        self.mojang_name_memory.clear()
+        self.username_memory.clear()
+        self.hypixel_player_memory.clear()
+        self.hypixel_guild_memory.clear()
+        self.texture_memory.clear()
+        self.texture_color_memory.clear()
+        self.negative_memory.clear()
+
+    @synchronized
     def clear_cache(self):
+        """clears everything except favorites (and their skins)"""
+        self._flush_pending_writes() # queued favorites must not be lost
+        self._clear_memory_cache()
         self.cursor.execute("DELETE FROM hypixel_guild_cache")
+        self.cursor.execute("DELETE FROM guild_members")
         self.cursor.execute("DELETE FROM hypixel_player_cache")
         self.cursor.execute("DELETE FROM mojang_cache")
+        self.cursor.execute(
+            "DELETE FROM textures WHERE NOT (variant = 'skin_showcase' AND texture_hash IN (SELECT skin_hash FROM favorites WHERE skin_hash IS NOT NULL))"
+            )
+        self.cursor.execute("DELETE FROM texture_colors")
+        self.cursor.execute("DELETE FROM negative_cache")
         self.conn.commit()
 
         self.cursor.execute("VACUUM") # clear extra space
         self.conn.commit()
         logger.info("Cache has been cleared")
-        self.conn.close()
+
+    def close(self):
+        """stops the flush thread, commits queued writes and closes the connection"""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self._flush_pending_writes()
+            self.conn.close()
+        self.flush_requested.set()
+        self.flush_thread.join(timeout = 5)
+        logger.info("Cache connection closed")
+
+
+_shared_cache_manager = None
+_shared_cache_manager_lock = threading.Lock()
+
+def get_cache_manager(storage_profile: dict = None, ttl_policy: dict = None) -> CacheManager:
+    """
+    Returns the shared CacheManager, it's opened on first use and closed when the process exits
+    storage_profile and ttl_policy are only used when the cache is opened
+    """
+    global _shared_cache_manager
+    with _shared_cache_manager_lock:
+        if _shared_cache_manager is None:
+            _shared_cache_manager = CacheManager(storage_profile = storage_profile, ttl_policy = ttl_policy)
+            atexit.register(close_cache_manager)
+        return _shared_cache_manager
+
+def close_cache_manager() -> None:
+    global _shared_cache_manager
+    with _shared_cache_manager_lock:
+        if _shared_cache_manager is not None:
+            _shared_cache_manager.close()
+            _shared_cache_manager = None
 
 if __name__ == "__main__":
     cache_instance = CacheManager()
@@ -1,10 +1,27 @@
-from utils import pillow_to_b64
+from utils import pillow_to_b64, load_base64_to_pillow
+from memory_cache import LRUTTLCache
+from palette import analyze_image
 from PIL import Image
-import numpy as np
+import threading
 import logging
 
 logger = logging.getLogger(__name__)
 
+# cape id -> reveal frames, there are only a few dozen distinct capes so each is rendered once
+_cape_frames = LRUTTLCache(max_size = 64, ttl = 24 * 60 * 60)
+_cape_frames_lock = threading.Lock()
+
+def get_cape_frames(cape_id: str, cape_b64: str) -> list[str]:
+    """returns the reveal animation for a cape as b64 frames, rendered on first use and cached by cape id"""
+    with _cape_frames_lock:
+        frames = _cape_frames.get(cape_id)
+    if frames is None:
+        frames = CapeAnimator(load_base64_to_pillow(cape_b64)).render_frames()
+        with _cape_frames_lock:
+            _cape_frames.set(cape_id, frames)
+        logger.info(f"rendered {len(frames)} animation frames for cape {cape_id}")
+    return frames
+
 class CapeAnimator:
     def __init__(self, cape_img):
         self.cape_img = cape_img
@@ -22,26 +39,20 @@ class CapeAnimator:
         self.current_line += 1
         return pillow_to_b64(self.animated_pil_image)
 
+    def render_frames(self) -> list[str]:
+        """every frame of the reveal at once, one more row per frame, encoded as b64"""
+        frames = []
+        while self.revealed_pixels < self.total_pixels:
+            frames.append(self.animate())
+        return frames
+
     def get_revealed_pixels(self):
         return self.revealed_pixels
 
     def get_average_color_pil(self):
+        """alpha-weighted average colour of the cape as hex, None if it's fully transparent"""
         logger.info(f"getting average color of cape: {self.cape_img}")
-        image = self.cape_img
-        pixels = np.array(image)
-        average_color = pixels.mean(axis = (0, 1))
-        average_color_tuple = tuple(average_color.astype(int))
-
-        try:
-            r = int(average_color_tuple[0])
-            g = int(average_color_tuple[1])
-            b = int(average_color_tuple[2])
-            rgb = f"#{r:02x}{g:02x}{b:02x}"
-            logging.info(f"average color of cape: {rgb}")
-            return rgb
-        except Exception as e:
-            logging.error(f"something went wrong while getting color values: {e}")
-            return None
+        return analyze_image(self.cape_img)["average"]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,63 @@
+import base64
+import json
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# images for the cape gallery, read once from cape/ and stored as base64 in a manifest
+# the showcase capes are 10x16 already, so they're stored as-is and scaled up by the gallery
+# the manifest records every file's mtime, adding, removing or editing a cape regenerates it
+
+MANIFEST_VERSION = 2
+
+
+def is_gallery_file(file_name: str) -> bool:
+    """showcase images only, raw textures, back views and the no cape placeholder are left out"""
+    return file_name.endswith(".png") and "raw" not in file_name and "no_cape" not in file_name and "back" not in file_name
+
+def folder_signature(cape_folder) -> dict:
+    """file name -> mtime (ns) of every gallery file, used to tell if the manifest is out of date"""
+    signature = {}
+    with os.scandir(cape_folder) as entries:
+        for entry in entries:
+            if entry.is_file() and is_gallery_file(entry.name):
+                signature[entry.name] = entry.stat().st_mtime_ns
+    return signature
+
+def read_image_b64(path) -> str:
+    with open(path, "rb") as file:
+        return base64.b64encode(file.read()).decode("utf-8")
+
+def load_gallery_manifest(cape_folder, manifest_path) -> list[dict]:
+    """
+    Returns [{"name", "image_b64"}] for every cape in cape_folder, sorted by name.
+    Reads the manifest if it matches the folder, otherwise regenerates it.
+    """
+    signature = folder_signature(cape_folder)
+    try:
+        with open(manifest_path, "r", encoding = "utf-8") as file:
+            manifest = json.load(file)
+        if manifest["version"] == MANIFEST_VERSION and manifest["signature"] == signature:
+            return manifest["capes"]
+        logger.info("cape folder changed, regenerating the gallery manifest")
+    except FileNotFoundError:
+        logger.info("no cape gallery manifest yet, generating it")
+    except Exception as e:
+        logger.warning(f"couldn't read cape gallery manifest, regenerating it: {e}")
+
+    capes = []
+    for file_name in sorted(signature):
+        try:
+            capes.append({"name": file_name[:-4], "image_b64": read_image_b64(os.path.join(cape_folder, file_name))})
+        except Exception as e:
+            logger.error(f"couldn't read {file_name} for the cape gallery: {e}")
+
+    try:
+        os.makedirs(os.path.dirname(manifest_path), exist_ok = True)
+        with open(manifest_path, "w", encoding = "utf-8") as file:
+            json.dump({"version": MANIFEST_VERSION, "signature": signature, "capes": capes}, file)
+    except Exception as e:
+        logger.error(f"couldn't save cape gallery manifest: {e}")
+    logger.info(f"generated the gallery manifest for {len(capes)} capes")
+    return capes
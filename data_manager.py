@@ -1,8 +1,15 @@
-from cache_manager import CacheManager
+from cache_manager import CacheManager, get_cache_manager, normalize_uuid, NEGATIVE_MOJANG, NEGATIVE_HYPIXEL_PLAYER, NEGATIVE_HYPIXEL_GUILD
 from hypixel_api import GetHypixelData
 from minecraft_api import GetMojangAPIData
 from online_status import OnlineStatus
+from http_client import HttpTransport, get_transport
+from single_flight import SingleFlight
 from utils import load_base64_to_pillow
+from palette import analyze_image
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import threading
+import time
 import logging
 import os
 from dotenv import load_dotenv
@@ -11,45 +18,139 @@ from dotenv import load_dotenv
 logger = logging.getLogger(__name__)
 
 class DataManager:
-    def __init__(self, hypixel_api_key: str, cache_enabled: bool = True, cache_time: int = 300):
+    def __init__(
+            self, hypixel_api_key: str, cache_enabled: bool = True, cache_time: int = 300,
+            transport: HttpTransport = None, name_lookup_concurrency: int = 8, cache_instance: CacheManager = None,
+            negative_cache_time: int = 60, stale_while_revalidate: bool = True, max_stale: int = 24 * 60 * 60
+            ):
+        """
+        negative_cache_time: seconds a "doesn't exist" result (unknown player, no hypixel profile, no guild) is reused
+        stale_while_revalidate: expired cache entries are returned right away and refreshed in the background
+        max_stale: seconds past cache_time an expired entry can still be returned, older entries are fetched again first
+        """
         self.hypixel_api_key = hypixel_api_key
-        self.cache_instance = CacheManager()
+        self.transport = transport or get_transport()
+        self.cache_instance = cache_instance or get_cache_manager()
         self.cache_time = cache_time
         self.cache_enabled = cache_enabled
+        self.name_lookup_concurrency = name_lookup_concurrency
+        self.negative_cache_time = negative_cache_time
+        self.stale_while_revalidate = stale_while_revalidate
+        self.max_stale = max_stale
+
+        # background refreshes for stale entries, keyed by (endpoint, key) so each runs at most once at a time
+        self.refresh_executor = ThreadPoolExecutor(max_workers = 2, thread_name_prefix = "cache-refresh")
+        self.refreshing = set()
+        self.refresh_lock = threading.Lock()
+
+        # concurrent upstream requests for the same (endpoint, key) share one request
+        self.single_flight = SingleFlight()
+
+    def _cache_state(self, cache_entry: dict | None) -> str:
+        """returns "missing", "fresh", "stale" (expired, but can be served while it gets refreshed) or "expired"."""
+        if cache_entry is None:
+            return "missing"
+        if cache_entry["is_fresh"]:
+            return "fresh"
+        if self.stale_while_revalidate and time.time() < cache_entry["expires_at"] + self.max_stale:
+            return "stale"
+        return "expired"
+
+    def _schedule_refresh(self, refresh_key: tuple, fetch_function, *args) -> None:
+        """runs fetch_function(*args) in the background, unless a refresh for refresh_key is already running"""
+        with self.refresh_lock:
+            if refresh_key in self.refreshing:
+                return
+            self.refreshing.add(refresh_key)
+
+        def refresh():
+            try:
+                asyncio.run(fetch_function(*args))
+                logger.info(f"refreshed stale cache for {refresh_key}")
+            except Exception as e:
+                logger.error(f"background refresh failed for {refresh_key}: {e}")
+            finally:
+                with self.refresh_lock:
+                    self.refreshing.discard(refresh_key)
+
+        logger.info(f"serving stale cache for {refresh_key}, refreshing in the background")
+        self.refresh_executor.submit(refresh)
+
+    def _get_fresh_negative_entry(self, kind: str, lookup_key: str) -> dict | None:
+        if not self.cache_enabled:
+            return None
+        negative_entry = self.cache_instance.get_negative_cache_entry(kind, lookup_key, self.negative_cache_time)
+        if negative_entry is None or not negative_entry["is_fresh"]:
+            return None
+        return negative_entry
+
+    def is_mojang_cached(self, search_term: str, include_textures: bool = True) -> bool:
+        """True if get_mojang_data_async(search_term, include_textures) would answer from the cache without calling the Mojang API"""
+        if not self.cache_enabled:
+            return False
+        data_from_cache = self.cache_instance.get_mojang_cache_entry(search_term, self.cache_time)
+        if self._cache_state(data_from_cache) in ("fresh", "stale"):
+            return not (include_textures and self._textures_missing(data_from_cache))
+        return self._get_fresh_negative_entry(NEGATIVE_MOJANG, search_term) is not None
+
+    def is_hypixel_cached(self, uuid: str) -> bool:
+        """True if get_hypixel_data_async would answer from the cache without calling the Hypixel API"""
+        if not self.cache_enabled:
+            return False
+        if self._get_fresh_negative_entry(NEGATIVE_HYPIXEL_PLAYER, uuid) is not None:
+            return True
+        data_from_cache = self.cache_instance.get_hypixel_cache_entry(uuid, self.cache_time, self.cache_time)
+        if self._cache_state(data_from_cache) not in ("fresh", "stale"):
+            return False
+        if data_from_cache["guild_id"] is None:
+            return True
+        return self._cache_state(data_from_cache["guild"]) in ("fresh", "stale") or self._find_cached_guild(uuid) is not None
 
     def get_mojang_data(self, search_term: str) -> dict:
+        """sync wrapper around get_mojang_data_async"""
+        return asyncio.run(self.get_mojang_data_async(search_term))
+
+    async def get_mojang_data_async(self, search_term: str, include_textures: bool = True) -> dict:
         """
         Fetches Mojang data for a given username or UUID.
+        With include_textures False skins and capes aren't downloaded (e.g. for batch lookups that don't show them),
+        the image keys can be None then. A cached player without its images counts as a miss when they're wanted.
         returns a dictionary with the following keys
         - status: "success", "lookup_failed", or "failed"
-        - source: "mojang_api" or "cache"
+        - source: "mojang_api", "cache" (a cached "player doesn't exist" also counts)
+          or "cache_stale" (expired but within max_stale, a refresh runs in the background)
         - uuid: the UUID of the player
         - username: the formatted username of the player
         - has_cape: boolean indicating if the player has a cape
         - cape_name: the name of the cape if the player has one, otherwise None
+        - skin_hash: the skin's texture hash
+        - cape_hash: the cape's texture hash (identifies the cape image), None without a cape
         - skin_showcase_b64: base64 encoded string of the player's skin showcase
         - cape_showcase_b64: base64 encoded string of the player's cape showcase
         - cape_back_b64: base64 encoded string of the player's cape back image
         """
 
-        status = "error"
-        source = None
-        
-        valid_cache = self.cache_instance.check_mojang_cache(search_term, self.cache_time)
-        logger.info(f"valid cache for {search_term}: {valid_cache}")
-        if valid_cache and self.cache_enabled: # if cache is valid, get data from cache
+        data_from_cache = self.cache_instance.get_mojang_cache_entry(search_term, self.cache_time) if self.cache_enabled else None
+        cache_state = self._cache_state(data_from_cache)
+        if cache_state in ("fresh", "stale") and include_textures and self._textures_missing(data_from_cache):
+            cache_state = "missing_textures" # cached by a lookup without textures, fetched again below
+        logger.info(f"cache for {search_term}: {cache_state}")
+        if cache_state in ("fresh", "stale"): # use the data from cache, stale data is refreshed in the background
             logger.info(f"using cache for {search_term}")
-            data_from_cache = self.cache_instance.get_data_from_mojang_cache(search_term)
             try:
-                uuid = data_from_cache["uuid"]
-                formated_username = data_from_cache["username"]
-                has_cape = data_from_cache["has_cape"]
-                cape_id = data_from_cache["cape_name"]
-                skin_showcase_b64 = data_from_cache["skin_showcase_b64"]
-                cape_showcase_b64 = data_from_cache["cape_front_b64"]
-                cape_back_b64 = data_from_cache["cape_back_b64"]
-                status = "success"
-                source = "cache"
+                response = {
+                    "status": "success",
+                    "source": "cache" if cache_state == "fresh" else "cache_stale",
+                    "uuid": data_from_cache["uuid"],
+                    "username": data_from_cache["username"],
+                    "has_cape": bool(data_from_cache["has_cape"]),
+                    "cape_name": data_from_cache["cape_name"],
+                    "skin_hash": data_from_cache["skin_hash"],
+                    "cape_hash": data_from_cache["cape_hash"],
+                    "skin_showcase_b64": data_from_cache["skin_showcase_b64"],
+                    "cape_showcase_b64": data_from_cache["cape_front_b64"],
+                    "cape_back_b64": data_from_cache["cape_back_b64"]
+                }
             except KeyError as e:
                 logger.error(f"KeyError while getting data from cache: {e}")
                 return {
@@ -58,39 +159,97 @@ class DataManager:
                     "uuid": None,
                     "username": None,
                     "has_cape": None,
+                    "skin_hash": None,
+                    "cape_hash": None,
                     "skin_showcase_b64": None,
                     "cape_showcase_b64": None,
                     "cape_back_b64": None
                 }
                 
             logger.debug(f"data from cache: {data_from_cache}")
+            if cache_state == "stale":
+                # refreshed by uuid, so a changed username is picked up too
+                self._schedule_refresh(("mojang", response["uuid"]), self._fetch_mojang_data, response["uuid"], include_textures)
+            return response
+
+        if self._get_fresh_negative_entry(NEGATIVE_MOJANG, search_term) is not None:
+            logger.info(f"{search_term} was recently not found, not calling the Mojang API again")
+            return {
+                "status": "lookup_failed",
+                "source": "cache",
+                "uuid": None,
+                "username": None,
+                "has_cape": False,
+                "cape_name": None,
+                "skin_hash": None,
+                "cape_hash": None,
+                "skin_showcase_b64": None,
+                "cape_showcase_b64": None,
+                "cape_back_b64": None
+            }
+
+        if data_from_cache is not None and "uuid" not in data_from_cache["stale_fields"]:
+            # the name -> uuid mapping is still fresh, so only the profile is fetched again
+            return await self._fetch_mojang_data(data_from_cache["uuid"], include_textures)
+        return await self._fetch_mojang_data(search_term, include_textures)
 
-        else: # if cache is not valid, get data from mojang api
-            if len(search_term) <= 16: # if text inputted is less than 16 chars (max username length) search is treated as a name
-                mojang_instance = GetMojangAPIData(search_term)
+    def _textures_missing(self, data_from_cache: dict) -> bool:
+        return data_from_cache["skin_showcase_b64"] is None or (
+            bool(data_from_cache["has_cape"]) and (data_from_cache["cape_front_b64"] is None or data_from_cache["cape_back_b64"] is None)
+            )
+
+    async def _fetch_mojang_data(self, search_term: str, include_textures: bool = True) -> dict:
+        """
+        Fetches Mojang data for a given username or UUID from the Mojang API and caches it.
+        Concurrent fetches for the same player share one request (lookups with and without textures are separate).
+        Returns the same dictionary as get_mojang_data_async.
+        """
+        lookup_key = normalize_uuid(search_term) or search_term.lower()
+        flight_key = ("mojang", lookup_key) if include_textures else ("mojang_profile", lookup_key)
+        return await self.single_flight.run(flight_key, self._request_mojang_data, search_term, include_textures)
+
+    async def _request_mojang_data(self, search_term: str, include_textures: bool = True) -> dict:
+        # textures already in the cache (other players can share a skin or cape) aren't downloaded again
+        texture_lookup = self.cache_instance.get_texture_b64 if self.cache_enabled else None
+        if len(search_term) <= 16: # if text inputted is less than 16 chars (max username length) search is treated as a name
+            mojang_instance = GetMojangAPIData(
+                search_term, transport = self.transport, texture_lookup = texture_lookup, include_textures = include_textures
+                )
+        else:
+            mojang_instance = GetMojangAPIData(
+                None, search_term, transport = self.transport, texture_lookup = texture_lookup, include_textures = include_textures
+                )
+        formated_username, uuid, has_cape, skin_id, cape_id, lookup_failed, cape_showcase_b64, cape_back_b64, cape_showcase, skin_showcase_b64 = await mojang_instance.get_data_async()
+        if not lookup_failed:
+            logger.info(f"added cache for {formated_username}")
+            status = "success"
+            if self.cache_enabled:
+                self.cache_instance.add_mojang_cache(
+                    uuid, formated_username, has_cape, cape_id, skin_showcase_b64, cape_showcase_b64, cape_back_b64,
+                    skin_hash = mojang_instance.skin_id, cape_hash = mojang_instance.cape_hash if has_cape else None
+                    )
+                # the player exists now (e.g. a name that was free got taken), forget older "doesn't exist" results
+                for lookup_key in {search_term.lower(), formated_username.lower(), uuid}:
+                    self.cache_instance.remove_negative_cache(NEGATIVE_MOJANG, lookup_key)
             else:
-                mojang_instance = GetMojangAPIData(None, search_term)
-            formated_username, uuid, has_cape, skin_id, cape_id, lookup_failed, cape_showcase_b64, cape_back_b64, cape_showcase, skin_showcase_b64 = mojang_instance.get_data()
-            if not lookup_failed:
-                logger.info(f"added cache for {formated_username}")
-                status = "success"
-                source = "mojang_api"
-                if self.cache_enabled:
-                    self.cache_instance.add_mojang_cache(uuid, formated_username, has_cape, cape_id, skin_showcase_b64, cape_showcase_b64, cape_back_b64)
-                else:
-                    logger.info(f"result is valid for {formated_username}, but cache is disabled")
+                logger.info(f"result is valid for {formated_username}, but cache is disabled")
+        else:
+            status = "lookup_failed"
+            if mojang_instance.lookup_error == "not_found" and self.cache_enabled:
+                logger.info(f"{search_term} doesn't exist, adding negative cache")
+                self.cache_instance.add_negative_cache(NEGATIVE_MOJANG, search_term)
             else:
                 logger.info(f"lookup failed for {search_term}, not adding to cache")
-                status = "lookup_failed"
-                source = "mojang_api"
         
         response = {
             "status": status,
-            "source": source,
+            "source": "mojang_api",
             "uuid": uuid,
             "username": formated_username,
             "has_cape": bool(has_cape),
             "cape_name": cape_id,
+            "skin_hash": mojang_instance.skin_id,
+            "cape_hash": mojang_instance.cape_hash if has_cape else None,
             "skin_showcase_b64": skin_showcase_b64,
             "cape_showcase_b64": cape_showcase_b64,
             "cape_back_b64": cape_back_b64
@@ -98,108 +257,217 @@ class DataManager:
 
         return response
 
+    def get_cape_colors(self, cape_hash: str | None, cape_showcase_b64: str) -> dict:
+        """
+        Average and dominant colour of a cape ({"average": hex, "dominant": hex}),
+        computed once per cape texture and stored next to it in the cache
+        """
+        colors = self.cache_instance.get_texture_colors(cape_hash, "cape_front") if self.cache_enabled else None
+        if colors is None:
+            colors = analyze_image(load_base64_to_pillow(cape_showcase_b64))
+            if self.cache_enabled and cape_hash is not None:
+                self.cache_instance.add_texture_colors({cape_hash: colors}, "cape_front")
+        return colors
+
+    def get_hypixel_data(self, uuid, guild_members_to_fetch, resolve_guild_members: bool = True) -> dict:
+        """sync wrapper around get_hypixel_data_async"""
+        return asyncio.run(self.get_hypixel_data_async(uuid, guild_members_to_fetch, resolve_guild_members))
 
-    
-    def get_hypixel_data(self, uuid, guild_members_to_fetch) -> dict:
+    async def get_hypixel_data_async(self, uuid, guild_members_to_fetch, resolve_guild_members: bool = True) -> dict:
         """
         Fetches Hypixel data for a given UUID.
         returns a dictionary with the following keys
-        - status: "success", "date_error", or "failed"
-        - source: "cache" or "hypixel_api"
+        - status: "success", "player_not_found", "date_error", or "failed"
+        - source: "cache", "cache_stale" (refreshed in the background) or "hypixel_api"
         - first_login: the first login date of the player in a formatted string
         - player_rank: the rank of the player
-        - guild_members: a list of UUIDs of the guild members
+        - guild_roster: the first guild_members_to_fetch members as {"uuid", "rank", "joined", "exp_history"}
+        - guild_members: those members with their names ({"uuid", "name"}), None if resolve_guild_members is False
+          (iter_guild_member_pages resolves them page by page instead)
         - guild_name: the name of the guild
         - guild_id: the ID of the guild
         """
+        hypixel_response = await self._get_hypixel_response(uuid)
+        # a new dict, the response can be shared with other callers of the same request
+        response = {key: value for key, value in hypixel_response.items() if key != "roster"}
+        response["guild_roster"] = hypixel_response["roster"][:guild_members_to_fetch]
+        if resolve_guild_members:
+            response["guild_members"] = await self._resolve_guild_member_names([member["uuid"] for member in response["guild_roster"]])
+        else:
+            response["guild_members"] = None
+        return response
 
-        valid_cache = self.cache_instance.check_hypixel_player_cache(uuid, self.cache_time)
-        logger.info(f"valid cache for {uuid}: {valid_cache}")
+    async def iter_guild_member_pages(self, member_uuids: list[str], page_size: int = 15):
+        """
+        Resolves guild member names page by page, yields a list of {"uuid", "name"} for every page.
+        Lets the guild list show the first members right away and add the rest as they resolve.
+        """
+        for start in range(0, len(member_uuids), page_size):
+            yield await self._resolve_guild_member_names(member_uuids[start:start + page_size])
 
-        if valid_cache and self.cache_enabled:
-            logger.info(f"using cache for {uuid}")
-            data_from_cache = self.cache_instance.get_hypixel_player_cache(uuid)
-            if data_from_cache:
-                data_from_cache["source"] = "cache"
-                response = {
-                    "status": "incomplete",
+    def _cached_roster(self, data_from_guild_cache: dict) -> list[dict]:
+        """guild rows cached by older versions only have (some) member uuids"""
+        if data_from_guild_cache["roster"] is not None:
+            return data_from_guild_cache["roster"]
+        return [{"uuid": uuid, "rank": None, "joined": None, "exp_history": {}} for uuid in data_from_guild_cache["member_uuids"]]
+
+    async def _get_hypixel_response(self, uuid: str) -> dict:
+        """
+        Hypixel data for a UUID from the cache or the Hypixel API,
+        like get_hypixel_data_async but with the full guild roster under "roster" and no names
+        """
+        data_from_cache = self.cache_instance.get_hypixel_cache_entry(uuid, self.cache_time, self.cache_time) if self.cache_enabled else None
+        if data_from_cache is None:
+            if self._get_fresh_negative_entry(NEGATIVE_HYPIXEL_PLAYER, uuid) is not None:
+                logger.info(f"{uuid} recently had no hypixel profile, not calling the Hypixel API again")
+                return {
+                    "status": "player_not_found",
                     "source": "cache",
-                    "first_login": data_from_cache["first_login"],
-                    "player_rank": data_from_cache["rank"],
-                    "guild_id": data_from_cache["guild_id"],
+                    "first_login": None,
+                    "player_rank": None,
+                    "roster": [],
+                    "guild_name": None,
+                    "guild_id": None
                 }
-                logger.info(f"data from cache for {uuid}: {data_from_cache}")
-                if data_from_cache["guild_id"]:
-                    logger.info(f"guild id found in cache for player {uuid}: {data_from_cache['guild_id']}")
-                    data_from_guild_cache = self.cache_instance.get_hypixel_guild_cache(data_from_cache["guild_id"])
-
-                    guild_cache_valid = self.cache_instance.check_hypixel_guild_cache(data_from_cache["guild_id"], self.cache_time)
-                        
-                    if data_from_guild_cache and guild_cache_valid:
-
-                        resolved_guild_members = self._resolve_guild_member_names(data_from_guild_cache["member_uuids"])
-
-                        response["status"] = "success"
-                        response["guild_members"] = resolved_guild_members
-                        response["guild_name"] = data_from_guild_cache["guild_name"]
-                        return response
-                    else:
-                        logger.info(f"No guild cache found for {data_from_cache['guild_id']}, fetching new data")
-                        return self._fetch_hypixel_data(uuid, guild_members_to_fetch)
-                else:
-                    logger.info(f"No guild id found in cache for player {uuid}")
-                    response["status"] = "success"
-                    response["guild_members"] = []
-                    response["guild_name"] = None
-                    return response
-            else:
-                logger.info(f"No valid cache found for {uuid}, fetching new data")
-                return self._fetch_hypixel_data(uuid, guild_members_to_fetch)
-        else:
-            logger.info(f"cache not valid for {uuid}, fetching new data")
-            return self._fetch_hypixel_data(uuid, guild_members_to_fetch)
+            known_guild = self._find_cached_guild(uuid)
+            logger.info(f"no cache for {uuid}, fetching new data (guild already cached: {known_guild is not None})")
+            return await self._fetch_hypixel_data(uuid, fetch_guild = known_guild is None, known_guild = known_guild)
+
+        # only the parts with stale fields are fetched again: the player (rank, first login) and / or the guild
+        data_from_guild_cache = data_from_cache["guild"] # joined in the same query
+        player_stale = "first_login" in data_from_cache["stale_fields"] or "rank" in data_from_cache["stale_fields"]
+        guild_stale = "guild_id" in data_from_cache["stale_fields"] or (
+            data_from_cache["guild_id"] is not None and (data_from_guild_cache is None or not data_from_guild_cache["is_fresh"])
+            )
+        if guild_stale:
+            known_guild = self._find_cached_guild(uuid)
+            if known_guild is not None: # e.g. cached while browsing a guildmate, no need to ask /v2/guild again
+                logger.info(f"found {uuid} in cached guild {known_guild['guild_id']}")
+                self.cache_instance.set_hypixel_player_guild(uuid, known_guild["guild_id"], known_guild["timestamp"])
+                data_from_cache = self.cache_instance.get_hypixel_cache_entry(uuid, self.cache_time, self.cache_time)
+                data_from_guild_cache = data_from_cache["guild"]
+                guild_stale = False
+        cache_states = [self._cache_state(data_from_cache)]
+        if data_from_cache["guild_id"] is not None:
+            cache_states.append(self._cache_state(data_from_guild_cache))
+        if "missing" in cache_states or "expired" in cache_states:
+            logger.info(f"cache not valid for {uuid}, fetching new data (player: {player_stale}, guild: {guild_stale})")
+            return await self._fetch_hypixel_data(
+                uuid, fetch_player = player_stale, fetch_guild = guild_stale, data_from_cache = data_from_cache
+                )
+        cache_state = "stale" if "stale" in cache_states else "fresh"
+
+        logger.info(f"using cache for {uuid} ({cache_state})")
+        response = {
+            "status": "success",
+            "source": "cache",
+            "first_login": data_from_cache["first_login"],
+            "player_rank": data_from_cache["rank"],
+            "roster": [],
+            "guild_name": None,
+            "guild_id": data_from_cache["guild_id"],
+        }
+        logger.debug(f"data from cache for {uuid}: {data_from_cache}")
+        if cache_state == "stale":
+            response["source"] = "cache_stale"
+            self._schedule_refresh(("hypixel", uuid), self._fetch_hypixel_data, uuid, player_stale, guild_stale, data_from_cache)
+
+        if not data_from_cache["guild_id"]:
+            logger.info(f"No guild id found in cache for player {uuid}")
+            return response
+
+        logger.info(f"guild id found in cache for player {uuid}: {data_from_cache['guild_id']}")
+        response["roster"] = self._cached_roster(data_from_guild_cache)
+        response["guild_name"] = data_from_guild_cache["guild_name"]
+        return response
             
     
-    def _fetch_hypixel_data(self, uuid: str, guild_members_to_fetch: int) -> dict:
+    def _find_cached_guild(self, uuid: str) -> dict | None:
+        """a fresh cached guild that lists this player as a member, or None"""
+        if not self.cache_enabled:
+            return None
+        guild_entry = self.cache_instance.get_guild_for_member(uuid, self.cache_time)
+        if guild_entry is None or not guild_entry["is_fresh"]:
+            return None
+        return guild_entry
+
+    async def _fetch_hypixel_data(
+            self, uuid: str, fetch_player: bool = True, fetch_guild: bool = True, data_from_cache: dict = None, known_guild: dict = None
+            ) -> dict:
+        """same as _request_hypixel_data, concurrent fetches for the same player share one request"""
+        return await self.single_flight.run(
+            ("hypixel", normalize_uuid(uuid) or uuid), self._request_hypixel_data, uuid, fetch_player, fetch_guild, data_from_cache, known_guild
+            )
+
+    async def _request_hypixel_data(
+            self, uuid: str, fetch_player: bool = True, fetch_guild: bool = True, data_from_cache: dict = None, known_guild: dict = None
+            ) -> dict:
         """
         Fetches Hypixel data for a given UUID.
-        Returns a dictionary with the Hypixel data.
+        Player and guild requests only need the UUID, so they run at the same time.
+        With fetch_player / fetch_guild False, that part is taken from data_from_cache instead
+        (or known_guild, a cached guild the player was found in).
+        The guild request is also skipped if the player recently had no guild.
+        Returns the same dictionary as _get_hypixel_response.
         """
-        hypxiel_data_instance = GetHypixelData(uuid, self.hypixel_api_key, guild_members_to_fetch)
-        first_login, player_rank, hypixel_request_status = hypxiel_data_instance.get_basic_data()
+        hypxiel_data_instance = GetHypixelData(uuid, self.hypixel_api_key, transport = self.transport)
+        known_no_guild = fetch_guild and self._get_fresh_negative_entry(NEGATIVE_HYPIXEL_GUILD, uuid) is not None
 
-        guild_members = []
-        guild_members, guild_name, guild_id = hypxiel_data_instance.get_guild_info()
+        async def cached_player():
+            return data_from_cache["first_login"], data_from_cache["rank"], "success"
 
-        # Prepare data to cache, only store raw uuids
-        data_to_cache = {
-            "status": hypixel_request_status,
-            "source": "hypixel_api",
-            "first_login": first_login,
-            "player_rank": player_rank,
-            "guild_name": guild_name,
-            "guild_id": guild_id,
-            "member_uuids": guild_members
-        }
+        async def cached_guild():
+            if known_no_guild:
+                logger.info(f"{uuid} recently had no guild, skipping guild request")
+                return [], None, None
+            data_from_guild_cache = known_guild or (data_from_cache["guild"] if data_from_cache is not None else None)
+            if data_from_guild_cache is None:
+                return [], None, None
+            return self._cached_roster(data_from_guild_cache), data_from_guild_cache["guild_name"], data_from_guild_cache["guild_id"]
+
+        async def request_guild():
+            _, guild_name, guild_id = await asyncio.to_thread(hypxiel_data_instance.get_guild_info)
+            return hypxiel_data_instance.guild_roster or [], guild_name, guild_id
+
+        basic_data, guild_info = await asyncio.gather(
+            asyncio.to_thread(hypxiel_data_instance.get_basic_data) if fetch_player else cached_player(),
+            request_guild() if fetch_guild and not known_no_guild else cached_guild()
+        )
+        first_login, player_rank, hypixel_request_status = basic_data
+        roster, guild_name, guild_id = guild_info
+        guild_fetched = fetch_guild and hypxiel_data_instance.guild_status in ("success", "no_guild")
+
+        if self.cache_enabled:
+            if hypixel_request_status == "player_not_found":
+                self.cache_instance.add_negative_cache(NEGATIVE_HYPIXEL_PLAYER, uuid)
+            if hypxiel_data_instance.guild_status == "no_guild":
+                self.cache_instance.add_negative_cache(NEGATIVE_HYPIXEL_GUILD, uuid, "no_guild")
 
-        # Only add to cache if the request was successful
+        # Only add to cache if the request was successful, only store raw uuids
         if hypixel_request_status == "success" and self.cache_enabled:
-            self.cache_instance.add_hypixel_cache(uuid, data_to_cache)
+            if fetch_player:
+                self.cache_instance.add_hypixel_player_cache(uuid, first_login, player_rank)
+                self.cache_instance.remove_negative_cache(NEGATIVE_HYPIXEL_PLAYER, uuid)
+            if hypxiel_data_instance.guild_status == "success":
+                self.cache_instance.remove_negative_cache(NEGATIVE_HYPIXEL_GUILD, uuid)
+            if guild_fetched or known_no_guild:
+                self.cache_instance.add_hypixel_guild_membership(uuid, guild_id, guild_name, [member["uuid"] for member in roster], roster)
+            elif known_guild is not None:
+                self.cache_instance.set_hypixel_player_guild(uuid, known_guild["guild_id"], known_guild["timestamp"])
 
-        resolved_guild_members = self._resolve_guild_member_names(guild_members)
         response = {
             "status": hypixel_request_status,
             "source": "hypixel_api",
             "first_login": first_login,
             "player_rank": player_rank,
-            "guild_members": resolved_guild_members,
+            "roster": roster,
             "guild_name": guild_name,
             "guild_id": guild_id
         }
 
         return response
     
-    def _resolve_guild_member_names(self, member_uuids: list[str]) -> list[dict]:
+    async def _resolve_guild_member_names(self, member_uuids: list[str]) -> list[dict]:
         """
         Takes a list of UUIDs and returns a list of resolved members
         (e.g., [{"uuid": ..., "name": ...}]), using the cache intelligently.
@@ -226,18 +494,84 @@ class DataManager:
             logger.info("All names were resolved from cache.")
         else:
             logger.info(f"Fetching {len(missing_uuids)} missing names from Mojang API.")
-            # fetch missing names from Mojang API
-            for uuid in missing_uuids:
-                mojang_data = self.get_mojang_data(uuid)
-                if mojang_data and mojang_data["status"] == "success":
-                    resolved_members[uuid] = mojang_data["username"]
-                else:
-                    resolved_members[uuid] = "N/A" # Handle failed lookups
+            fetched_names = await self._fetch_names_for_uuids(missing_uuids)
+            resolved_members.update(fetched_names)
+
+            if self.cache_enabled and fetched_names:
+                self.cache_instance.add_mojang_usernames(fetched_names)
 
         # Create the final list of dictionaries with UUIDs and names
-        final_list = [{"uuid": uuid, "name": resolved_members.get(uuid, "N/A")} for uuid in member_uuids]
+        final_list = [{"uuid": uuid, "name": resolved_members.get(uuid, "N/A")} for uuid in member_uuids] # N/A for failed lookups
         return final_list
 
+    async def _fetch_names_for_uuids(self, uuids: list[str]) -> dict:
+        """
+        Name-only lookup for a list of UUIDs, skips skin and cape downloads.
+        Mojang has no bulk endpoint for UUID -> name, so lookups run concurrently,
+        at most name_lookup_concurrency at a time.
+        A name that's already being looked up (e.g. a player in two guilds being resolved) is only requested once.
+        Returns a dictionary mapping UUIDs to usernames, failed lookups are left out.
+        """
+        semaphore = asyncio.Semaphore(self.name_lookup_concurrency)
+
+        async def request_name(uuid):
+            async with semaphore:
+                mojang_instance = GetMojangAPIData(None, uuid, transport = self.transport)
+                return await asyncio.to_thread(mojang_instance.get_name)
+
+        async def fetch_name(uuid):
+            return uuid, await self.single_flight.run(("mojang_name", normalize_uuid(uuid) or uuid), request_name, uuid)
+
+        results = await asyncio.gather(*(fetch_name(uuid) for uuid in uuids))
+        return {uuid: username for uuid, username in results if username is not None}
+
+    def get_online_status(self, username: str, uuid: str) -> str:
+        """sync wrapper around get_online_status_async"""
+        return asyncio.run(self.get_online_status_async(username, uuid))
+
+    async def get_online_status_async(self, username: str, uuid: str) -> str:
+        """Returns "Wynncraft", "Hypixel" or "offline" """
+        async def request_status():
+            online_status_instance = OnlineStatus(username, uuid, self.hypixel_api_key, transport = self.transport)
+            return await online_status_instance.requests_manager()
+
+        return await self.single_flight.run(("online_status", normalize_uuid(uuid) or uuid), request_status)
+
+    async def get_player_bundle(
+            self, search_term: str, guild_members_to_fetch: int = 15, include_hypixel: bool = True, include_status: bool = True,
+            resolve_guild_members: bool = True, include_textures: bool = True
+            ) -> dict:
+        """
+        Fetches everything needed for a player card.
+        Mojang data is fetched first (the UUID is needed for everything else),
+        then Hypixel data and online status are fetched at the same time.
+        returns a dictionary with the following keys
+        - mojang: the result of get_mojang_data
+        - hypixel: the result of get_hypixel_data, or None if it wasn't fetched
+          (with resolve_guild_members False, guild member names are left to iter_guild_member_pages)
+          (with include_textures False, skins and capes aren't downloaded, see get_mojang_data_async)
+        - online_status: "Wynncraft", "Hypixel", "offline", or None if it wasn't fetched
+        """
+        mojang_data = await self.get_mojang_data_async(search_term, include_textures)
+        player_bundle = {
+            "mojang": mojang_data,
+            "hypixel": None,
+            "online_status": None
+        }
+
+        if mojang_data["status"] != "success":
+            logger.info(f"mojang lookup failed for {search_term}, skipping hypixel and status requests")
+            return player_bundle
+
+        async def no_result():
+            return None
+
+        hypixel_task = self.get_hypixel_data_async(mojang_data["uuid"], guild_members_to_fetch, resolve_guild_members) if include_hypixel else no_result()
+        status_task = self.get_online_status_async(mojang_data["username"], mojang_data["uuid"]) if include_status else no_result()
+        player_bundle["hypixel"], player_bundle["online_status"] = await asyncio.gather(hypixel_task, status_task)
+
+        return player_bundle
+
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
     load_dotenv()
@@ -0,0 +1,81 @@
+from cache_manager import CacheManager
+import threading
+import json
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class FavoritesStore:
+    """
+    The user's favorite players, stored in the favorites table of cache.db.
+    Favorites are read from the database once and kept in memory (uuid -> favorite, in the order they were added),
+    so membership checks are O(1) and adding or removing one only writes that row.
+    Skins are stored once in the textures table and referenced by texture hash.
+    """
+    def __init__(self, cache_instance: CacheManager):
+        self.cache_instance = cache_instance
+        self.lock = threading.Lock()
+        self.favorites = {favorite["uuid"]: favorite for favorite in cache_instance.get_favorites()}
+
+    def __contains__(self, uuid: str) -> bool:
+        return uuid in self.favorites
+
+    def __len__(self) -> int:
+        return len(self.favorites)
+
+    def uuids(self) -> list[str]:
+        with self.lock:
+            return list(self.favorites)
+
+    def all(self) -> list[dict]:
+        """every favorite as {"uuid", "username", "skin_b64"}, in the order they were added"""
+        with self.lock:
+            favorites = list(self.favorites.values())
+        skins = self.cache_instance.get_textures_b64([favorite["skin_hash"] for favorite in favorites], "skin_showcase")
+        return [
+            {
+                "uuid": favorite["uuid"],
+                "username": favorite["username"],
+                "skin_b64": skins.get(favorite["skin_hash"])
+            }
+            for favorite in favorites
+        ]
+
+    def add(self, uuid: str, username: str, skin_showcase_b64: str = None, skin_hash: str = None) -> None:
+        skin_hash = self.cache_instance.add_favorite(uuid, username, skin_showcase_b64, skin_hash)
+        with self.lock:
+            self.favorites[uuid] = {"uuid": uuid, "username": username, "skin_hash": skin_hash}
+
+    def remove(self, uuid: str) -> None:
+        with self.lock:
+            self.favorites.pop(uuid, None)
+        self.cache_instance.remove_favorite(uuid)
+
+    def migrate_from_json(self, json_path) -> int:
+        """
+        One-time import of the old favorites.json, it's renamed to favorites.json.migrated afterwards.
+        Returns how many favorites were imported.
+        """
+        if not os.path.exists(json_path):
+            return 0
+        try:
+            with open(json_path, "r", encoding = "utf-8") as file:
+                old_favorites = json.load(file)
+        except Exception as e:
+            logger.error(f"couldn't read {json_path} for migration: {e}")
+            return 0
+
+        imported = 0
+        for favorite in old_favorites:
+            try:
+                if favorite["uuid"] not in self:
+                    self.add(favorite["uuid"], favorite["username"], favorite.get("skin_b64"))
+                    imported += 1
+            except Exception as e:
+                logger.error(f"couldn't migrate favorite {favorite}: {e}")
+
+        os.replace(json_path, f"{json_path}.migrated")
+        logger.info(f"migrated {imported} favorites from {json_path}")
+        return imported
@@ -0,0 +1,138 @@
+from rate_limiter import RateLimiter, backoff_delay, MAX_BACKOFF
+import requests
+from requests.adapters import HTTPAdapter
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# one pool per upstream host: api.minecraftservices.com, sessionserver.mojang.com,
+# textures.minecraft.net, api.hypixel.net and api.wynncraft.com
+DEFAULT_POOL_CONNECTIONS = 8
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = 10
+DEFAULT_MAX_RETRIES = 3 # retries for 429s, 5xx and connection errors
+
+
+class HttpTransport:
+    """
+    Process-wide HTTP transport shared by GetMojangAPIData, GetHypixelData and OnlineStatus.
+    Wraps a single requests.Session, so connections are pooled per host and kept alive
+    between lookups instead of doing a new TCP + TLS handshake for every request.
+    - pool_connections: how many hosts keep a connection pool
+    - pool_size: max connections kept open per host
+    - timeout: default timeout in seconds, used when a request doesn't pass its own
+    - rate_limits: per upstream (requests per second, burst size), see rate_limiter.DEFAULT_RATE_LIMITS
+    - max_retries: how often 429s, 5xx and connection errors are retried, with jittered exponential backoff
+    Requests wait for the upstream's rate limiter instead of failing.
+    """
+    def __init__(
+            self, pool_connections: int = DEFAULT_POOL_CONNECTIONS, pool_size: int = DEFAULT_POOL_SIZE, timeout: float = DEFAULT_TIMEOUT,
+            rate_limits: dict = None, max_retries: int = DEFAULT_MAX_RETRIES
+            ):
+        self.pool_connections = pool_connections
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.rate_limiter = RateLimiter(rate_limits)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections = pool_connections, pool_maxsize = pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        logger.info(f"created http transport (pools: {pool_connections}, pool size: {pool_size}, timeout: {timeout}s)")
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Sends a request through the upstream's rate limiter.
+        429s and 5xx are retried after Retry-After or a jittered backoff, a 429 pauses the whole upstream.
+        Waits are capped at MAX_BACKOFF, if the server asks for longer its response is returned right away.
+        The last response is returned if retries run out, so callers still see the status code.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        bucket = self.rate_limiter.bucket_for(url, kwargs.get("headers"))
+
+        for attempt in range(self.max_retries + 1):
+            if bucket is not None:
+                bucket.acquire()
+
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.ConnectionError as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = backoff_delay(attempt)
+                logger.warning(f"connection error for {method} {url}, retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+                continue
+
+            if bucket is not None:
+                bucket.update_from_headers(response.headers)
+
+            if response.status_code != 429 and response.status_code < 500:
+                return response
+            if attempt == self.max_retries:
+                logger.error(f"{method} {url} still failing with {response.status_code} after {self.max_retries} retries")
+                return response
+
+            retry_after = self._retry_after(response)
+            if retry_after is not None and retry_after > MAX_BACKOFF:
+                # not worth waiting for (hypixel's reset can be minutes), the caller reports it as rate limited
+                logger.error(f"{method} {url} returned {response.status_code}, retry after {retry_after:.0f}s is too long, giving up")
+                if response.status_code == 429 and bucket is not None:
+                    bucket.back_off(MAX_BACKOFF)
+                return response
+
+            delay = min(retry_after or backoff_delay(attempt), MAX_BACKOFF)
+            logger.warning(f"{method} {url} returned {response.status_code}, retrying in {delay:.1f}s")
+            if response.status_code == 429 and bucket is not None:
+                bucket.back_off(delay) # the next acquire waits, together with everyone else using this upstream
+            else:
+                time.sleep(delay)
+
+        return response
+
+    def _retry_after(self, response: requests.Response) -> float | None:
+        retry_after = response.headers.get("Retry-After") or response.headers.get("RateLimit-Reset")
+        try:
+            return float(retry_after) if retry_after is not None else None
+        except ValueError:
+            return None
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_shared_transport = None
+_shared_transport_lock = threading.Lock()
+
+def get_transport() -> HttpTransport:
+    """Returns the shared transport, creating it with default settings on first use"""
+    global _shared_transport
+    with _shared_transport_lock:
+        if _shared_transport is None:
+            _shared_transport = HttpTransport()
+        return _shared_transport
+
+def configure_transport(
+        pool_size: int = DEFAULT_POOL_SIZE, timeout: float = DEFAULT_TIMEOUT, pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+        rate_limits: dict = None, max_retries: int = DEFAULT_MAX_RETRIES
+        ) -> HttpTransport:
+    """
+    Replaces the shared transport with one using the given settings.
+    Clients created afterwards pick up the new transport, the old one is closed.
+    """
+    global _shared_transport
+    with _shared_transport_lock:
+        old_transport = _shared_transport
+        _shared_transport = HttpTransport(pool_connections, pool_size, timeout, rate_limits, max_retries)
+    if old_transport is not None:
+        old_transport.close()
+    return _shared_transport
@@ -1,3 +1,4 @@
+from http_client import HttpTransport, get_transport
 import requests
 import datetime
 from dotenv import load_dotenv
@@ -7,7 +8,6 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-load_dotenv()
 rank_map = {
     "VIP": "VIP",
     "VIP_PLUS": "VIP+",
@@ -18,23 +18,26 @@ rank_map = {
 
 
 class GetHypixelData:
-    def __init__(self, uuid, hypixel_api_key, guild_members_to_fetch = 15):
+    def __init__(self, uuid, hypixel_api_key, guild_members_to_fetch = 15, transport: HttpTransport = None):
         self.uuid = uuid
         self.api_key = hypixel_api_key
         self.guild_members_to_fetch = guild_members_to_fetch
+        self.transport = transport or get_transport()
+        self.guild_status = None # set by get_guild_info: "success", "no_guild" or "error"
+        self.guild_roster = None # set by get_guild_info: every member as {"uuid", "rank", "joined", "exp_history"}
 
     def get_basic_data(self):
         """
         requires uuid and api key
         returns first login date (as month/year format) and player rank and request_status
-        returns None, None, None if player is not found
+        returns None, None, "player_not_found" if the player never joined Hypixel
         """
         payload = {
             "uuid": self.uuid
         }
 
         try:
-            player_data = requests.get(
+            player_data = self.transport.get(
                 url = "https://api.hypixel.net/v2/player",
                 params = payload,
                 headers = {"API-Key": self.api_key}
@@ -51,6 +54,9 @@ class GetHypixelData:
             if e.response.status_code == 403:
                 logger.error(f"Invalid API key: {e}")
                 request_status = "invalid_api_key"
+            elif e.response.status_code == 429:
+                logger.error(f"Hypixel rate limit hit even after retrying: {e}")
+                request_status = "rate_limited"
             else:
                 logger.error(f"HTTP error occurred: {e}")
                 request_status = "http_error"
@@ -64,6 +70,10 @@ class GetHypixelData:
             request_status = "unkown_error"
             return None, None, request_status
 
+        if json_player_data.get("player") is None:
+            logger.info(f"no hypixel profile for {self.uuid}")
+            return None, None, "player_not_found"
+
         #try:
         #    with open("hypixel_player_data.json", "w", encoding="utf-8") as file:
         #        json.dump(json_player_data, file, indent = 4)
@@ -105,12 +115,14 @@ class GetHypixelData:
         """
         requires uuid and api key
         returns a list with a specified number of guild members, a guild_name and guild id
-        return None, None, None if it fails
+        return None, None, None if it fails or the player has no guild, guild_status tells them apart
+        the full roster is kept in guild_roster
         """
+        self.guild_status = "error"
         try:
             payload = {"player": self.uuid}
 
-            guild_response = requests.get(
+            guild_response = self.transport.get(
                 url = "https://api.hypixel.net/v2/guild",
                 params = payload,
                 headers = {"API-Key": self.api_key}
@@ -121,6 +133,7 @@ class GetHypixelData:
             logger.debug(guild_response)
             if guild_response.json()["guild"] is None:
                 logger.info("no guild")
+                self.guild_status = "no_guild"
                 return None, None, None
 
             guild_response_json = guild_response.json()
@@ -128,11 +141,21 @@ class GetHypixelData:
             members = guild_response_json["guild"]["members"]
             guild_name = guild_response_json["guild"]["name"]
             guild_id = guild_response_json["guild"]["_id"]
+            self.guild_roster = [
+                {
+                    "uuid": member["uuid"],
+                    "rank": member.get("rank"),
+                    "joined": member.get("joined"), # unix time in milliseconds
+                    "exp_history": member.get("expHistory", {}) # date -> guild exp earned that day
+                }
+                for member in members
+            ]
             guild_members = []
             for index, member in enumerate(members):
                 if index < self.guild_members_to_fetch: # gets the first x members of the guild
                     guild_members.append(member["uuid"])
 
+            self.guild_status = "success"
             return guild_members, guild_name, guild_id
         except requests.exceptions.HTTPError as e:
             logger.error(f"HTTP error occurred: {e}")
@@ -149,6 +172,7 @@ class GetHypixelData:
 
 
 if __name__ == "__main__":
+    load_dotenv()
     uuid = "bb3c62c3428340789779d1b0db7a7743"
     hypixel_api_key = os.getenv("hypixel_api_key")
 
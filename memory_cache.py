@@ -0,0 +1,53 @@
+from collections import OrderedDict
+import time
+
+
+class LRUTTLCache:
+    """
+    Small in-memory cache, used by CacheManager in front of SQLite.
+    - max_size: once full, the least recently used entry is evicted
+    - ttl: seconds an entry stays in memory, no matter how often it's used
+    Not thread-safe by itself, CacheManager only uses it while holding its lock.
+    """
+    def __init__(self, max_size: int = 1024, ttl: float = 300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict() # key -> (expires_at, value)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """returns the cached value, or None if it's missing or expired"""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self.entries[key]
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value) -> None:
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last = False)
+
+    def invalidate(self, key) -> None:
+        self.entries.pop(key, None)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses
+        }
@@ -1,10 +1,14 @@
 from utils import pillow_to_b64
+from http_client import HttpTransport, get_transport
+from memory_cache import LRUTTLCache
 import requests
+import asyncio
 import json
 import base64
 import io
 from PIL import Image
 import os
+import threading
 import logging
 
 logger = logging.getLogger(__name__)
@@ -40,39 +44,126 @@ CAPE_MAP = {
     "26b546a54d519e6a3ff01efa01acce81": "Cobalt"
 }
 
+def texture_hash(texture_url: str) -> str:
+    """the last 32 characters of a texture url, they identify the skin or cape"""
+    return texture_url[-32:]
+
+
+# processed textures (face showcase, cape front / back) kept for the whole process, keyed by (texture hash, variant)
+# a texture hash always points to the same image, so these only get evicted to bound memory
+_texture_derivatives = LRUTTLCache(max_size = 512, ttl = 24 * 60 * 60)
+_texture_derivatives_lock = threading.Lock()
+
+def texture_path(texture_hash: str, variant: str) -> str:
+    """where store_img saves a processed texture (variant is "skin_showcase", "cape_front" or "cape_back")"""
+    parent_folder = os.path.dirname(__file__)
+    if variant == "skin_showcase":
+        return os.path.join(parent_folder, "skin", f"{texture_hash}.png")
+
+    cape_id = CAPE_MAP.get(texture_hash, texture_hash)
+    if variant == "cape_back":
+        return os.path.join(parent_folder, "cape", f"back_{cape_id}.png")
+    return os.path.join(parent_folder, "cape", f"{cape_id}.png")
+
+def remember_texture(texture_hash: str, variant: str, image_b64: str) -> None:
+    with _texture_derivatives_lock:
+        _texture_derivatives.set((texture_hash, variant), image_b64)
+
+def recall_texture(texture_hash: str, variant: str) -> str | None:
+    """
+    Returns a processed texture as a base64 string, first from memory, then from the images store_img saved.
+    Returns None if the texture was never processed.
+    """
+    if texture_hash is None:
+        return None
+    with _texture_derivatives_lock:
+        image_b64 = _texture_derivatives.get((texture_hash, variant))
+    if image_b64 is not None:
+        return image_b64
+
+    filepath = texture_path(texture_hash, variant)
+    if not os.path.exists(filepath):
+        return None
+    try:
+        with open(filepath, "rb") as file:
+            image_b64 = base64.b64encode(file.read()).decode("utf-8")
+    except OSError as e:
+        logger.warning(f"couldn't read stored texture {filepath}: {e}")
+        return None
+
+    remember_texture(texture_hash, variant, image_b64)
+    return image_b64
+
 class GetMojangAPIData:
-    def __init__(self, username, uuid = None):
+    def __init__(self, username, uuid = None, transport: HttpTransport = None, texture_lookup = None, include_textures: bool = True):
+        """
+        texture_lookup is an optional callable (texture_hash, variant) -> b64 string or None,
+        used to skip downloading textures that were already processed
+        variants are "skin_showcase", "cape_front" and "cape_back"
+        textures processed earlier in this process (or saved by store_img) are always reused
+        with include_textures False only the profile is fetched, the images are left as None (the hashes are still set)
+        """
         self.username = username
         self.uuid = uuid
+        self.transport = transport or get_transport()
+        self.texture_lookup = texture_lookup
+        self.include_textures = include_textures
         self.skin_url = None
         self.cape_url = None
         self.has_cape = None
         self.skin_id = None
         self.cape_id = None
+        self.cape_hash = None
         self.cape_back = None
         self.cape_showcase = None
         self.skin_showcase_b64 = None
         self.cape_back_b64 = None
         self.cape_showcase_b64 = None
+        self.lookup_error = None # "not_found" if the player doesn't exist, "transient" for timeouts, 429s and 5xx
 
     
     def get_data(self):
         """
         master function, gets uuid if not provided and then calls get_skin_data
         returns case-sensitive username, uuid, has_cape(bool), skin_id, cape_id, cape_showcase(b64), cape_back(b64), cape_showcase(PIL)
+        sync wrapper around get_data_async
+        """
+        return asyncio.run(self.get_data_async())
+
+    async def get_data_async(self):
+        """
+        same as get_data, but awaitable
+        uuid and profile requests depend on each other, the skin and cape downloads run at the same time
         """
         lookup_failed = False
         if not self.uuid:
             logger.info(f"no uuid found, calling API for {self.username}")
-            if self.get_uuid():
-                self.get_skin_data() # only tries get_skin_data if request suceeds
+            if await asyncio.to_thread(self.get_uuid):
+                await asyncio.to_thread(self.get_skin_data) # only tries get_skin_data if request suceeds
             else:
                 lookup_failed = True
         else:
-            self.get_skin_data()
+            await asyncio.to_thread(self.get_skin_data)
+
+        if self.skin_url is None:
+            lookup_failed = True
         
-        if self.skin_url is not None: # only tries to get skin and cape data if they exist
-            self.get_skin_images()
+        if self.skin_url is not None and self.include_textures: # only tries to get skin and cape data if they exist
+            skin_known, cape_known = await asyncio.to_thread(self.load_known_textures) # may read stored images from disk
+            download_skin = not skin_known
+            download_cape = self.has_cape and not cape_known
+
+            if download_skin or download_cape:
+                async def no_download():
+                    return None
+                skin_bytes, cape_bytes = await asyncio.gather(
+                    asyncio.to_thread(self.download_texture, self.skin_url) if download_skin else no_download(),
+                    asyncio.to_thread(self.download_texture, self.cape_url) if download_cape else no_download()
+                )
+                if download_skin:
+                    await asyncio.to_thread(self.process_skin_image, skin_bytes)
+                if download_cape and cape_bytes is not None:
+                    await asyncio.to_thread(self.process_cape_image, cape_bytes)
         return self.username, self.uuid, self.has_cape, self.skin_id, self.cape_id, lookup_failed, self.cape_showcase_b64, self.cape_back_b64, self.cape_showcase, self.skin_showcase_b64
         
         
@@ -81,7 +172,12 @@ class GetMojangAPIData:
         receives uuid based on username
         """
         try:
-            request = requests.get(f"https://api.minecraftservices.com/minecraft/profile/lookup/name/{self.username}")
+            request = self.transport.get(f"https://api.minecraftservices.com/minecraft/profile/lookup/name/{self.username}")
+            if request.status_code in (204, 404):
+                logger.info(f"no player named {self.username}")
+                self.lookup_error = "not_found"
+                return False
+            request.raise_for_status()
             logger.info("request success for getting UUID!")
             json_request = json.loads(request.text)
             logger.debug(json_request)
@@ -91,6 +187,7 @@ class GetMojangAPIData:
             
         except Exception as e:
             logger.error(f"something went wrong in get_uuid: {e}")
+            self.lookup_error = "transient"
             return False
     
     def get_skin_data(self) -> None:
@@ -102,7 +199,12 @@ class GetMojangAPIData:
         """
 
         try:
-            request = requests.get(f"https://sessionserver.mojang.com/session/minecraft/profile/{self.uuid}")
+            request = self.transport.get(f"https://sessionserver.mojang.com/session/minecraft/profile/{self.uuid}")
+            if request.status_code in (204, 404): # the session server answers 204 for uuids that don't exist
+                logger.info(f"no player with uuid {self.uuid}")
+                self.lookup_error = "not_found"
+                return
+            request.raise_for_status()
             json_request = json.loads(request.text)
             logger.info("request success for getting skin and cape data!")
 
@@ -118,10 +220,13 @@ class GetMojangAPIData:
             logger.info(f"skin link: {properties_json["textures"]["SKIN"]["url"]}")
             
             self.skin_url = properties_json["textures"]["SKIN"]["url"]
+            self.skin_id = texture_hash(self.skin_url)
             
             try:
                 logger.info(f"cape link: {properties_json["textures"]["CAPE"]["url"]}")
                 self.cape_url = properties_json["textures"]["CAPE"]["url"]
+                self.cape_hash = texture_hash(self.cape_url)
+                self.cape_id = CAPE_MAP.get(self.cape_hash, self.cape_hash)
                 self.has_cape = True
 
             except:
@@ -130,17 +235,52 @@ class GetMojangAPIData:
 
         except Exception as e:
             logger.error(f"something went wrong in get_skin_data: {e}")
+            self.lookup_error = "transient"
 
-    def get_skin_images(self):
+    def find_known_texture(self, texture_hash: str, variant: str) -> str | None:
+        """looks a processed texture up in texture_lookup, then in memory / on disk"""
+        if self.texture_lookup is not None:
+            image_b64 = self.texture_lookup(texture_hash, variant)
+            if image_b64 is not None:
+                return image_b64
+        return recall_texture(texture_hash, variant)
+
+    def load_known_textures(self) -> tuple[bool, bool]:
         """
-        This downloads the images from skin url and optionally cape url(if it exists)
-        then saves them locally 
+        Fills in skin and cape images when their hash was already processed.
+        Returns (skin_known, cape_known).
         """
+        skin_showcase_b64 = self.find_known_texture(self.skin_id, "skin_showcase")
+        if skin_showcase_b64 is not None:
+            self.skin_showcase_b64 = skin_showcase_b64
+            logger.info(f"skin {self.skin_id} already known, skipping download")
+
+        cape_known = False
+        if self.has_cape:
+            cape_showcase_b64 = self.find_known_texture(self.cape_hash, "cape_front")
+            cape_back_b64 = self.find_known_texture(self.cape_hash, "cape_back")
+            if cape_showcase_b64 is not None and cape_back_b64 is not None:
+                self.cape_showcase_b64 = cape_showcase_b64
+                self.cape_back_b64 = cape_back_b64
+                cape_known = True
+                logger.info(f"cape {self.cape_id} already known, skipping download")
+
+        return skin_showcase_b64 is not None, cape_known
+
+    def download_texture(self, url) -> bytes | None:
+        """downloads a skin or cape texture, returns the raw png bytes or None if it fails"""
         try:
-            response_skin = requests.get(self.skin_url) # skin image request
-            skin_bytes = io.BytesIO(response_skin.content)
+            response = self.transport.get(url)
+            response.raise_for_status()
+            return response.content
+        except Exception as e:
+            logger.error(f"something went wrong while downloading texture {url}: {e}")
+            return None
 
-            full_skin_image = Image.open(skin_bytes)
+    def process_skin_image(self, skin_bytes) -> None:
+        """crops the face out of the skin (with the overlay on top) and saves it locally"""
+        try:
+            full_skin_image = Image.open(io.BytesIO(skin_bytes))
             logger.debug("skin image opened successfully")
 
             try: # we overlap base face with outer layer here
@@ -155,6 +295,7 @@ class GetMojangAPIData:
                 self.skin_showcase.paste(skin_showcase_overlay, paste_area, mask = alpha_mask)
 
                 self.skin_showcase_b64 = pillow_to_b64(self.skin_showcase)
+                remember_texture(self.skin_id, "skin_showcase", self.skin_showcase_b64)
 
                 self.store_img(self.skin_showcase, "skin", "showcase")
                 
@@ -162,46 +303,38 @@ class GetMojangAPIData:
                 logger.error(f"something went wrong while cropping skin image: {e}")
 
         except Exception as e:
-            logger.error(f"something went wrong in get_skin_images: {e}")
-        
-
-        # cape section
-        if self.has_cape: # only gets image if url exists
-            try:
-                response_cape = requests.get(self.cape_url)
-                cape_bytes = io.BytesIO(response_cape.content)
+            logger.error(f"something went wrong in process_skin_image: {e}")
 
-                full_cape_image = Image.open(cape_bytes) # uncropped cape image
-                logger.info("cape image opened successfully")
-            except Exception as e:
-                logger.error(f"something went wrong while fetching cape image: {e}")
-
-            try:
-                crop_area = (1, 1, 11, 17)
-                self.cape_showcase = full_cape_image.crop(crop_area)
-
-            except Exception as e:
-                logger.error(f"something went wrong while cropping cape image: {e}") 
+    def process_cape_image(self, cape_bytes) -> None:
+        """crops the front and back out of the cape and saves them locally"""
+        try:
+            full_cape_image = Image.open(io.BytesIO(cape_bytes)) # uncropped cape image
+            logger.info("cape image opened successfully")
+        except Exception as e:
+            logger.error(f"something went wrong while opening cape image: {e}")
+            return
 
-            try:
-                crop_area = (12, 1, 22, 17)
-                self.cape_back = full_cape_image.crop(crop_area)
-            except Exception as e:
-                logger.error(f"something went wrong while cropping back of cape: {e}")
+        try:
+            crop_area = (1, 1, 11, 17)
+            self.cape_showcase = full_cape_image.crop(crop_area)
 
-            self.cape_showcase_b64 = pillow_to_b64(self.cape_showcase)
-            self.cape_back_b64 = pillow_to_b64(self.cape_back)
+        except Exception as e:
+            logger.error(f"something went wrong while cropping cape image: {e}") 
 
-            self.store_img(self.cape_showcase, "cape", "showcase")
-            self.store_img(full_cape_image, "cape", "full")
-            self.store_img(self.cape_back, "cape", "back")
+        try:
+            crop_area = (12, 1, 22, 17)
+            self.cape_back = full_cape_image.crop(crop_area)
+        except Exception as e:
+            logger.error(f"something went wrong while cropping back of cape: {e}")
 
-            return self.skin_showcase_b64, self.cape_showcase_b64, self.cape_back_b64
-            
-        else:
-            logger.info(f"no cape for user {self.username}")
+        self.cape_showcase_b64 = pillow_to_b64(self.cape_showcase)
+        self.cape_back_b64 = pillow_to_b64(self.cape_back)
+        remember_texture(self.cape_hash, "cape_front", self.cape_showcase_b64)
+        remember_texture(self.cape_hash, "cape_back", self.cape_back_b64)
 
-            return self.skin_showcase_b64, None, None
+        self.store_img(self.cape_showcase, "cape", "showcase")
+        self.store_img(full_cape_image, "cape", "full")
+        self.store_img(self.cape_back, "cape", "back")
 
     def store_img(self, image, type, format) -> None:
         """
@@ -247,7 +380,7 @@ class GetMojangAPIData:
 
     def get_name(self):
         try:
-            request = requests.get(f"https://sessionserver.mojang.com/session/minecraft/profile/{self.uuid}")
+            request = self.transport.get(f"https://sessionserver.mojang.com/session/minecraft/profile/{self.uuid}")
 
             request.raise_for_status()
 
@@ -265,6 +398,26 @@ class GetMojangAPIData:
             logger.error(f"something went wrong while getting name from uuid: {e}")
             return None
         
+BULK_LOOKUP_SIZE = 10 # max names per bulk request
+
+def get_uuids_bulk(usernames: list[str], transport: HttpTransport = None) -> dict | None:
+    """
+    Looks up to BULK_LOOKUP_SIZE usernames in one request.
+    Returns a dictionary mapping lowercase username -> (uuid, case-sensitive username),
+    names that don't exist are left out. Returns None if the request fails.
+    """
+    transport = transport or get_transport()
+    try:
+        response = transport.post(
+            "https://api.minecraftservices.com/minecraft/profile/lookup/bulk/byname", json = usernames[:BULK_LOOKUP_SIZE]
+            )
+        response.raise_for_status()
+        return {profile["name"].lower(): (profile["id"], profile["name"]) for profile in response.json()}
+    except Exception as e:
+        logger.error(f"something went wrong in get_uuids_bulk: {e}")
+        return None
+
+
 if __name__ == "__main__":
     user = GetMojangAPIData("goskyhigh")
     user.get_data()
\ No newline at end of file
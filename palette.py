@@ -0,0 +1,80 @@
+from PIL import Image
+import numpy as np
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# colour analysis for capes, used for the home page gradient
+# every function returns {"average": hex, "dominant": hex}, either can be None for a fully transparent image
+
+
+def to_hex(rgb) -> str | None:
+    if rgb is None or np.isnan(rgb).any():
+        return None
+    r, g, b = (int(round(channel)) for channel in rgb)
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+def average_colors(pixels: np.ndarray) -> np.ndarray:
+    """
+    alpha-weighted mean colour of a stack of images, so transparent pixels don't darken the result
+    pixels has shape (images, height, width, 4), returns (images, 3) with nan for fully transparent images
+    """
+    alpha = pixels[..., 3:4] / 255
+    weight = alpha.sum(axis = (1, 2))
+    with np.errstate(invalid = "ignore", divide = "ignore"):
+        return (pixels[..., :3] * alpha).sum(axis = (1, 2)) / weight
+
+def dominant_color(pixels: np.ndarray, k: int = 4, iterations: int = 10) -> np.ndarray | None:
+    """centre of the largest k-means cluster of the (mostly) opaque pixels of one image, shape (height, width, 4)"""
+    opaque = pixels[pixels[..., 3] >= 128][:, :3]
+    if len(opaque) == 0:
+        return None
+
+    # deterministic start: k pixels spread over the brightness range
+    by_brightness = opaque[opaque.sum(axis = 1).argsort()]
+    k = min(k, len(np.unique(opaque, axis = 0)))
+    centers = by_brightness[np.linspace(0, len(opaque) - 1, k).astype(int)]
+
+    for _ in range(iterations):
+        distances = ((opaque[:, None, :] - centers[None, :, :]) ** 2).sum(axis = 2)
+        labels = distances.argmin(axis = 1)
+        new_centers = np.array([
+            opaque[labels == cluster].mean(axis = 0) if (labels == cluster).any() else centers[cluster] for cluster in range(k)
+            ])
+        if np.allclose(new_centers, centers):
+            break
+        centers = new_centers
+
+    return centers[np.bincount(labels, minlength = k).argmax()]
+
+def analyze_image(image: Image.Image) -> dict:
+    """average and dominant colour of one image"""
+    pixels = np.asarray(image.convert("RGBA"), dtype = np.float64)
+    return {
+        "average": to_hex(average_colors(pixels[None])[0]),
+        "dominant": to_hex(dominant_color(pixels))
+    }
+
+def analyze_folder(folder, file_names: list[str]) -> dict:
+    """
+    Colours for many images at once, returns file name without extension -> colours.
+    Images of the same size are stacked and averaged in one vectorized pass.
+    """
+    by_size = {} # size -> [(name, pixels)]
+    for file_name in file_names:
+        try:
+            with Image.open(os.path.join(folder, file_name)) as image:
+                pixels = np.asarray(image.convert("RGBA"), dtype = np.float64)
+        except Exception as e:
+            logger.error(f"couldn't read {file_name} for colour analysis: {e}")
+            continue
+        by_size.setdefault(pixels.shape, []).append((os.path.splitext(file_name)[0], pixels))
+
+    colors = {}
+    for images in by_size.values():
+        stack = np.stack([pixels for _, pixels in images])
+        for (name, pixels), average in zip(images, average_colors(stack)):
+            colors[name] = {"average": to_hex(average), "dominant": to_hex(dominant_color(pixels))}
+    logger.info(f"analyzed colours of {len(colors)} images in {folder}")
+    return colors
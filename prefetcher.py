@@ -0,0 +1,120 @@
+from data_manager import DataManager
+from cache_manager import normalize_uuid
+from collections import deque
+import threading
+import asyncio
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Prefetcher:
+    """
+    Warms the cache in the background for players the user is likely to open next (favorites, visible guildmates),
+    so clicking them is a cache hit.
+    Players are fetched one at a time on a single daemon thread, and only while the upstream has more than
+    reserve of its rate limit left, so foreground lookups always come first.
+    cancel() (called when a foreground lookup starts) drops everything that hasn't started yet,
+    a request that's already in flight is shared with the foreground lookup through DataManager's single flight.
+    """
+    def __init__(self, data_manager: DataManager, include_hypixel: bool = False, reserve: float = 0.5, max_players: int = 50):
+        self.data_manager = data_manager
+        self.include_hypixel = include_hypixel
+        self.reserve = reserve
+        self.max_players = max_players
+
+        self.queue = deque() # (uuid, include_hypixel)
+        self.condition = threading.Condition()
+        self.generation = 0 # bumped by prefetch() and cancel(), work from an older generation is dropped
+        self.thread = None
+        self.prefetched = 0 # players that needed a request
+        self.skipped = 0 # players that were already cached
+
+    def prefetch(self, uuids, include_hypixel: bool = None) -> None:
+        """replaces the queue with uuids (in priority order), anything queued before is dropped"""
+        if not self.data_manager.cache_enabled:
+            return
+        include_hypixel = self.include_hypixel if include_hypixel is None else include_hypixel
+
+        with self.condition:
+            self.generation += 1
+            self.queue.clear()
+            queued = set()
+            for uuid in uuids:
+                uuid = normalize_uuid(uuid)
+                if uuid is None or uuid in queued:
+                    continue
+                queued.add(uuid)
+                self.queue.append((uuid, include_hypixel))
+                if len(self.queue) >= self.max_players:
+                    break
+            logger.info(f"prefetching {len(self.queue)} players (hypixel: {include_hypixel})")
+            self.condition.notify()
+
+            if self.thread is None:
+                self.thread = threading.Thread(target = self._run, name = "prefetch", daemon = True)
+                self.thread.start()
+
+    def cancel(self) -> None:
+        """drops queued prefetches, called when a foreground lookup starts"""
+        with self.condition:
+            self.generation += 1
+            if self.queue:
+                logger.info(f"cancelled {len(self.queue)} queued prefetches")
+            self.queue.clear()
+
+    def _run(self) -> None:
+        while True:
+            with self.condition:
+                while not self.queue:
+                    self.condition.wait()
+                uuid, include_hypixel = self.queue.popleft()
+                generation = self.generation
+
+            try:
+                asyncio.run(self._warm(uuid, include_hypixel, generation))
+            except Exception as e:
+                logger.error(f"prefetch failed for {uuid}: {e}")
+
+    def _cancelled(self, generation: int) -> bool:
+        return generation != self.generation
+
+    def _wait_for_headroom(self, upstream: str, generation: int) -> bool:
+        """waits until the upstream has budget to spare, returns False if the prefetch was cancelled meanwhile"""
+        rate_limiter = self.data_manager.transport.rate_limiter
+        while not rate_limiter.has_headroom(upstream, self.reserve):
+            if self._cancelled(generation):
+                return False
+            time.sleep(0.5)
+        return not self._cancelled(generation)
+
+    async def _warm(self, uuid: str, include_hypixel: bool, generation: int) -> None:
+        requested = False
+        if not self.data_manager.is_mojang_cached(uuid):
+            if not self._wait_for_headroom("mojang_session", generation):
+                return
+            mojang_data = await self.data_manager.get_mojang_data_async(uuid)
+            requested = True
+            if mojang_data["status"] != "success":
+                return
+
+        if include_hypixel and self.data_manager.hypixel_api_key and not self.data_manager.is_hypixel_cached(uuid):
+            if not self._wait_for_headroom("hypixel", generation):
+                return
+            await self.data_manager.get_hypixel_data_async(uuid, 0, resolve_guild_members = False)
+            requested = True
+
+        if requested:
+            self.prefetched += 1
+            logger.debug(f"prefetched {uuid}")
+        else:
+            self.skipped += 1
+
+    def stats(self) -> dict:
+        with self.condition:
+            return {
+                "queued": len(self.queue),
+                "prefetched": self.prefetched,
+                "skipped": self.skipped
+            }
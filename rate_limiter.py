@@ -0,0 +1,160 @@
+from urllib.parse import urlsplit
+import threading
+import random
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# upstream -> (requests per second, burst size)
+# Hypixel keys get 300 requests per 5 minutes, Mojang allows roughly 600 profile lookups per 10 minutes,
+# the session server and Wynncraft are more generous but still answer 429 when hammered
+DEFAULT_RATE_LIMITS = {
+    "hypixel": (1.0, 30),
+    "mojang_profile": (1.0, 60),
+    "mojang_session": (3.0, 50),
+    "wynncraft": (2.0, 20)
+}
+
+# hostname -> upstream, hosts that aren't listed (e.g. textures.minecraft.net) aren't limited
+UPSTREAM_HOSTS = {
+    "api.hypixel.net": "hypixel",
+    "api.minecraftservices.com": "mojang_profile",
+    "api.mojang.com": "mojang_profile",
+    "sessionserver.mojang.com": "mojang_session",
+    "api.wynncraft.com": "wynncraft"
+}
+
+MAX_BACKOFF = 30 # seconds
+
+
+def backoff_delay(attempt: int, base: float = 0.5) -> float:
+    """exponential backoff with full jitter, attempt starts at 0"""
+    return random.uniform(0, min(MAX_BACKOFF, base * 2 ** attempt))
+
+
+class TokenBucket:
+    """
+    Token bucket for one upstream, thread-safe.
+    acquire() waits for a token instead of failing, so bursts are queued and spread out.
+    The budget is adjusted from RateLimit-Remaining / RateLimit-Reset headers and paused on 429s.
+    """
+    def __init__(self, name: str, rate: float, capacity: int):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0 # set by headers / 429s, no requests go out before this
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self) -> None:
+        """takes a token, waiting for one if needed"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    break
+                else:
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+        if waited > 1:
+            logger.warning(f"waited {waited:.1f}s for {self.name} rate limit")
+
+    def update_from_headers(self, headers) -> None:
+        """adapts the budget to what the upstream says is left"""
+        remaining = headers.get("RateLimit-Remaining")
+        reset = headers.get("RateLimit-Reset")
+        if remaining is None:
+            return
+        try:
+            remaining = int(remaining)
+            reset = float(reset) if reset is not None else None
+        except ValueError:
+            return
+
+        with self.lock:
+            self.tokens = min(self.tokens, remaining)
+            if remaining <= 0 and reset is not None:
+                pause = min(reset, MAX_BACKOFF) # requests after that get a 429, which is handed back to the caller
+                self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+                logger.warning(f"{self.name} rate limit used up (resets in {reset:.0f}s), pausing for {pause:.0f}s")
+
+    def back_off(self, delay: float) -> None:
+        """pauses every request to this upstream, used after a 429"""
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+            self.tokens = 0
+
+    def has_headroom(self, reserve: float) -> bool:
+        """True if more than reserve (a fraction of the burst size) is left and the upstream isn't paused"""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            return now >= self.blocked_until and self.tokens > self.capacity * reserve
+
+    def stats(self) -> dict:
+        with self.lock:
+            self._refill(time.monotonic())
+            return {
+                "tokens": round(self.tokens, 2),
+                "rate": self.rate,
+                "capacity": self.capacity,
+                "blocked_for": max(0.0, round(self.blocked_until - time.monotonic(), 2))
+            }
+
+
+class RateLimiter:
+    """
+    Keeps a TokenBucket per upstream, Hypixel gets one per API key since the limit is per key.
+    rate_limits overrides DEFAULT_RATE_LIMITS, e.g. {"hypixel": [2.0, 60]}
+    """
+    def __init__(self, rate_limits: dict = None):
+        self.rate_limits = {**DEFAULT_RATE_LIMITS, **(rate_limits or {})}
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def bucket_for(self, url: str, headers: dict = None) -> TokenBucket | None:
+        """returns the bucket for a request, None if the host isn't rate limited"""
+        upstream = UPSTREAM_HOSTS.get(urlsplit(url).hostname)
+        if upstream is None:
+            return None
+
+        bucket_key = upstream
+        if upstream == "hypixel" and headers:
+            # header names are case-insensitive, so "Api-Key" and "API-Key" share the key's bucket
+            api_key = next((value for name, value in headers.items() if name.lower() == "api-key"), None)
+            bucket_key = (upstream, api_key)
+
+        with self.lock:
+            bucket = self.buckets.get(bucket_key)
+            if bucket is None:
+                rate, capacity = self.rate_limits[upstream]
+                bucket = TokenBucket(upstream, rate, capacity)
+                self.buckets[bucket_key] = bucket
+            return bucket
+
+    def has_headroom(self, upstream: str, reserve: float = 0.5) -> bool:
+        """
+        True if every bucket for an upstream has more than reserve of its burst left,
+        background work checks this so foreground lookups keep most of the budget
+        """
+        with self.lock:
+            buckets = [bucket for bucket in self.buckets.values() if bucket.name == upstream]
+        return all(bucket.has_headroom(reserve) for bucket in buckets)
+
+    def stats(self) -> dict:
+        with self.lock:
+            buckets = list(self.buckets.values())
+        return {bucket.name: bucket.stats() for bucket in buckets}
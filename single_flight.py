@@ -0,0 +1,61 @@
+import concurrent.futures
+import asyncio
+import threading
+import copy
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical requests, used by DataManager.
+    The first caller for a key runs the request, callers that arrive while it's in flight
+    wait for it. Every caller (the first one too) gets its own copy of the result, or the same exception.
+    Cancelling a caller only cancels that caller, the request keeps running for the others.
+    Works across threads and event loops (the UI, background refreshes and prefetching each run their own loop).
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = {} # key -> concurrent.futures.Future
+        self.coalesced = 0 # callers that didn't have to make their own request
+
+    async def run(self, key, coroutine_function, *args):
+        """awaits coroutine_function(*args), unless a call with the same key is already running"""
+        with self.lock:
+            future = self.in_flight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = concurrent.futures.Future()
+                self.in_flight[key] = future
+            else:
+                self.coalesced += 1
+
+        if not is_leader:
+            logger.info(f"waiting for in-flight request {key}")
+            # shielded too, cancelling one waiter would otherwise cancel the shared future for every other caller
+            return copy.copy(await asyncio.shield(asyncio.wrap_future(future)))
+
+        # shielded, so cancelling the leader (e.g. a superseded search) doesn't fail the callers waiting on it
+        task = asyncio.ensure_future(coroutine_function(*args))
+        task.add_done_callback(lambda task: self._finish(key, future, task))
+        return copy.copy(await asyncio.shield(task))
+
+    def _finish(self, key, future: concurrent.futures.Future, task: asyncio.Task) -> None:
+        with self.lock:
+            self.in_flight.pop(key, None)
+        if future.done():
+            return
+        if task.cancelled():
+            future.cancel()
+        elif task.exception() is not None:
+            future.set_exception(task.exception())
+        else:
+            future.set_result(task.result())
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "in_flight": len(self.in_flight),
+                "coalesced": self.coalesced
+            }
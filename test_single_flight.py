@@ -0,0 +1,40 @@
+from single_flight import SingleFlight
+import unittest
+import asyncio
+
+
+class SingleFlightTest(unittest.TestCase):
+    def test_cancelled_follower_does_not_cancel_the_others(self):
+        async def scenario():
+            single_flight = SingleFlight()
+            release = asyncio.Event()
+            calls = []
+
+            async def request():
+                calls.append(1)
+                await release.wait()
+                return {"status": "success"}
+
+            leader = asyncio.create_task(single_flight.run("key", request))
+            await asyncio.sleep(0)
+            cancelled_follower = asyncio.create_task(single_flight.run("key", request))
+            follower = asyncio.create_task(single_flight.run("key", request))
+            await asyncio.sleep(0)
+
+            cancelled_follower.cancel() # e.g. a superseded search
+            await asyncio.sleep(0)
+            new_caller = asyncio.create_task(single_flight.run("key", request))
+            await asyncio.sleep(0)
+            release.set()
+
+            results = await asyncio.gather(leader, follower, new_caller)
+            self.assertTrue(cancelled_follower.cancelled())
+            return results, calls
+
+        results, calls = asyncio.run(scenario())
+        self.assertEqual(results, [{"status": "success"}] * 3)
+        self.assertEqual(len(calls), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()